@@ -1,20 +1,15 @@
 import streamlit as st
-import os
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-
-# ------------ LOCAL MODULE IMPORTS (Phi-3) ---------------
-from generate_title import generate_title_from_abstract
-from generate_claims import generate_claims_from_abstract
-from generate_summary import summarize_abstract
-from generate_field_of_invention import generate_field_of_invention
-from generate_background import generate_background_locally
-from generate_detailed_description import generate_detailed_description
-from generate_brief_description import generate_brief_description
-from generate_summary_of_drawings import generate_drawing_descriptions as generate_drawing
-from generate_objects import generate_objects_of_invention
-from cpc_classifier import classify_cpc
-from export_to_pdf import create_patent_pdf
+import re
+import threading
+import concurrent.futures
+import functools
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from llm_loader import MODEL_VERSION  # loads no model at import
+
+# Local generator modules (Phi-3, BERT, ReportLab) are imported where they are
+# used: each one loads its model at import time, and Streamlit re-runs this
+# script on every widget interaction.
 
 # -------------- UI: HEADER & DISCLAIMER ------------------
 st.title("🧠 PatentDoc Co-Pilot")
@@ -32,140 +27,379 @@ with st.expander("⚠️ Legal Disclaimer & AI Usage Notice", expanded=False):
     """)
 
 # ---------------- MAIN INPUT FIELDS ---------------------
-abstract = st.text_area("📄 Enter Invention Abstract", height=200)
+# Inside a form, edits only reach the script on "Apply" (or Ctrl+Enter), so the app reruns
+# (and prefetches) once per edited abstract rather than on every change of focus.
+with st.form("inputs"):
+    abstract = st.text_area("📄 Enter Invention Abstract", height=200)
+    drawing_summary = st.text_area("🎨 Enter Drawing Summary (optional)", height=150)
+    st.form_submit_button("✔️ Apply")
 st.session_state["abstract_input"] = abstract
-drawing_summary = st.text_area("🎨 Enter Drawing Summary (optional)", height=150)
 
 # ----------------- SESSION STATE INIT -------------------
-for key in [
+# All generated texts live in one dict in session state, keyed by section
+SECTION_KEYS = (
     "title", "claims", "summary", "field_of_invention",
-    "background","objects_of_invention", "detailed_description", "brief_description", "summary_drawings", "cpc_result"
-]:
-    if key not in st.session_state:
-        st.session_state[key] = ""
+    "background", "objects_of_invention", "detailed_description", "brief_description", "summary_drawings", "cpc_result"
+)
+sections = st.session_state.setdefault("sections", dict.fromkeys(SECTION_KEYS, ""))
+
+# ------------------- RESULT HELPERS ---------------------
+def section_text(result, *keys):
+    """Return the display text from a generator result (dict or plain string)."""
+    if isinstance(result, dict):
+        for key in keys:
+            if result.get(key):
+                return result[key]
+        return ""
+    return result or ""
+
+
+# Markdown headers, **bold** and __underline__, stripped in a single pass
+MARKDOWN_RE = re.compile(r'(^#+\s+)|\*\*([^*]+)\*\*|__([^_]+)__', re.MULTILINE)
+
+
+def strip_markdown(text):
+    """Remove markdown headers, bold and underline from generated text."""
+    return MARKDOWN_RE.sub(lambda m: m.group(2) or m.group(3) or "", text)
+
+
+# ------------------- CACHED GENERATORS ------------------
+# Results are pickled to disk (persist="disk"), so a restarted server still answers repeat
+# abstracts from cache. MODEL_VERSION follows the GGUF file name, so swapping the model
+# regenerates cached sections.
+# Generation itself runs outside st.cache_data: it streams into an st.empty() placeholder
+# created by the caller, and Streamlit would record those element calls and try to replay
+# them on a cache hit. Only the finished output is stored.
+# The generator imports stay inside the wrappers so a cache hit never loads a model.
+
+class _CacheMiss(Exception):
+    """Raised by _stored_output on a lookup miss; exceptions are never cached."""
+
+
+@st.cache_data(show_spinner=False, max_entries=640, persist="disk")  # 64 per section
+def _stored_output(section, args, _output=None):
+    # Lookups pass no _output and miss; a store passes it and it becomes the cached value
+    if _output is None:
+        raise _CacheMiss
+    return _output
+
+
+def cached_section(generate):
+    """
+    Cache generate(*args, on_text=...) by section and arguments. Call the wrapper with
+    _on_text to stream a miss; a hit returns the stored output without running anything.
+    """
+    @functools.wraps(generate)
+    def wrapper(*args, _on_text=None):
+        try:
+            return _stored_output(generate.__name__, args)
+        except _CacheMiss:
+            pass
+        output = generate(*args, on_text=_on_text)
+        if output is not None:
+            _stored_output(generate.__name__, args, _output=output)
+        return output
+    return wrapper
+
+
+@st.cache_resource(show_spinner="Loading Phi-3 model...")
+def get_model():
+    """One Llama instance for the whole server, shared by every generator."""
+    from llm_loader import get_llm
+    return get_llm()
+
+
+@st.cache_resource(show_spinner="Loading Phi-3 model...")
+def get_fast_model():
+    """Model for the background and brief description (PATENTDOC_FAST_LLM_PATH, else get_model())."""
+    from llm_loader import get_fast_llm
+    return get_fast_llm()
+
+
+@cached_section
+def cached_title(abstract, model_version, on_text=None):
+    from generate_title import generate_title_from_abstract
+    return section_text(generate_title_from_abstract(abstract, on_text=on_text, llm=get_model()), "title")
+
+
+@cached_section
+def cached_claims(abstract, model_version, on_text=None):
+    from generate_claims import generate_claims_from_abstract
+    return section_text(generate_claims_from_abstract(abstract, on_text=on_text), "text", "claims")
+
+
+@cached_section
+def cached_summary(abstract, model_version, on_text=None):
+    from generate_summary import summarize_abstract
+    return section_text(summarize_abstract(abstract, on_text=on_text, llm=get_model()), "text", "summary")
+
+
+@cached_section
+def cached_field(abstract, model_version, on_text=None):
+    from generate_field_of_invention import generate_field_of_invention
+    return section_text(generate_field_of_invention(abstract, on_text=on_text, llm=get_model()), "text", "field")
+
+
+@cached_section
+def cached_background(abstract, model_version, on_text=None):
+    from generate_background import generate_background_locally
+    return section_text(generate_background_locally(abstract, on_text=on_text, llm=get_fast_model()), "text", "background")
+
+
+@cached_section
+def cached_objects(abstract, model_version, on_text=None):
+    from generate_objects import generate_objects_of_invention
+    result = generate_objects_of_invention(abstract, on_text=on_text, llm=get_model())
+    return strip_markdown(section_text(result, "text", "objects"))
+
+
+@cached_section
+def cached_detailed_description(abstract, claims, drawing_summary, model_version, on_text=None):
+    from generate_detailed_description import generate_detailed_description
+    result = generate_detailed_description(abstract, claims, drawing_summary,
+                                           on_text=on_text, llm=get_model())
+    return section_text(result, "text", "description")
+
+
+@cached_section
+def cached_brief_description(abstract, drawing_summary, model_version, on_text=None):
+    from generate_brief_description import generate_brief_description
+    result = generate_brief_description(abstract, figure_descriptions=drawing_summary,
+                                        on_text=on_text, llm=get_fast_model())
+    return section_text(result, "text", "description")
+
+
+@cached_section
+def cached_summary_drawings(abstract, model_version, on_text=None):
+    from generate_summary_of_drawings import generate_drawing_descriptions as generate_drawing
+    return section_text(generate_drawing(abstract, on_text=on_text, llm=get_model()), "text")
+
+
+@cached_section
+def cached_drawing_bundle(abstract, claims, drawing_summary, model_version, on_text=None):
+    from generate_drawing_bundle import generate_drawing_bundle
+    return generate_drawing_bundle(abstract, drawing_summary, claims, on_text=on_text, llm=get_model())
+
+
+# Near-duplicate abstracts (typo fixes, synonym swaps) miss the exact-match cache above,
+# so abstract-only sections are also looked up by embedding similarity.
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache():
+    from embeddings import get_embedder
+    from semantic_cache import SemanticCache
+    embedder = get_embedder()
+    return SemanticCache(lambda text: embedder.encode(text, normalize_embeddings=True), threshold=0.95)
+
+
+def semantic_cached(section, fn, abstract, _on_text=None):
+    """Return a stored result for a >= 0.95-similar abstract, else run fn and store its output."""
+    cache = get_semantic_cache()
+    cache_key = f"{section}:{MODEL_VERSION}"
+    vector, hit = cache.lookup(cache_key, abstract)
+    if hit is not None:
+        return hit
+    output = fn(abstract, MODEL_VERSION, _on_text=_on_text)
+    if output:
+        cache.store(cache_key, vector, output)
+    return output
+
+
+def with_script_run_ctx(fn):
+    """
+    Wrap fn to run on a worker thread under the current script run's context. Without it the
+    st.cache_* calls inside fn log "missing ScriptRunContext" and element calls are dropped.
+    """
+    ctx = get_script_run_ctx()
+
+    def run(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+    return run
+
+
+# Sections that only depend on the abstract, so they can be generated concurrently
+SECTION_TASKS = {
+    "title": cached_title,
+    "claims": cached_claims,
+    "summary": cached_summary,
+    "field_of_invention": cached_field,
+    "background": cached_background,
+    "objects_of_invention": cached_objects,
+    "summary_drawings": lambda a, v, _on_text=None: cached_summary_drawings(a, v, _on_text=_on_text).strip(),
+}
+
+# ------------------- PREFETCH ---------------------------
+# Streamlit reruns when the user finishes editing the abstract; start the short sections
+# in the background then, so the buttons below usually hit the cache. Model calls still
+# go through the shared lock, so a prefetch never runs concurrently with a click.
+PREFETCH_SECTIONS = ("title", "summary")
+
+
+@st.cache_resource
+def get_prefetch_executor():
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+
+@st.cache_resource
+def start_prompt_cache_warmup():
+    """Prefill the long static background prompt once per server, off the script thread."""
+    from generate_background import warm_prompt_cache
+    return get_prefetch_executor().submit(with_script_run_ctx(lambda: warm_prompt_cache(llm=get_fast_model())))
+
+
+start_prompt_cache_warmup()
+
+if abstract.strip() and st.session_state.get("_prefetched_abstract") != abstract:
+    st.session_state["_prefetched_abstract"] = abstract
+    for key in PREFETCH_SECTIONS:
+        get_prefetch_executor().submit(with_script_run_ctx(semantic_cached), key, SECTION_TASKS[key], abstract)
+
+# ------------------- GENERATE ALL (PARALLEL) ------------
+if st.button("⚡ Generate All Sections"):
+    if not abstract.strip():
+        st.warning("Please enter the invention abstract.")
+    else:
+        progress = st.progress(0.0, text="Generating sections in parallel...")
+        drawings_text = drawing_summary if drawing_summary.strip() else "No drawings provided."
+        # Abstract-only sections plus the brief description go out at once; the detailed
+        # description needs the claims, so it is submitted as soon as they finish.
+        total = planned = len(SECTION_TASKS) + 1 + bool(drawing_summary.strip())
+        # Workers run under this script run's context (the prefetch thread gets it per task)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=total, initializer=add_script_run_ctx,
+                                                   initargs=(None, get_script_run_ctx())) as executor:
+            futures = {executor.submit(semantic_cached, key, fn, abstract): key for key, fn in SECTION_TASKS.items()}
+            if drawing_summary.strip():
+                futures[executor.submit(cached_brief_description, abstract, drawing_summary, MODEL_VERSION)] = "brief_description"
+            done, failed = 0, []
+            while futures:
+                finished, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    key = futures.pop(future)
+                    label = key.replace("_", " ")
+                    try:
+                        sections[key] = future.result()
+                    except Exception as e:
+                        failed.append(label)
+                        st.error(f"❌ {label.capitalize()} generation failed: {e}")
+                    if key == "claims":
+                        # sections persists across reruns, so stale claims must not stand in for a failure
+                        if "claims" not in failed and sections.get("claims"):
+                            futures[executor.submit(cached_detailed_description, abstract, sections["claims"],
+                                                    drawings_text, MODEL_VERSION)] = "detailed_description"
+                        else:
+                            # No claims to describe, so the detailed description is skipped
+                            failed.append("detailed description")
+                            total -= 1
+                    done += 1
+                    progress.progress(done / total, text=f"Finished {label} ({done}/{total})")
+        if failed:
+            st.warning(f"⚠️ Generated {planned - len(failed)}/{planned} sections; "
+                       f"not generated: {', '.join(failed)}.")
+        else:
+            st.success("✅ All sections generated!")
 
 # ------------------- GENERATION BUTTONS -----------------
-# ------------------- GENERATION BUTTONS (FIXED) -----------------
-# ------------------- GENERATION BUTTONS (FIXED) -----------------
 if st.button("📌 Generate Title"):
     with st.spinner("Generating title..."):
         try:
-            result = generate_title_from_abstract(abstract)
-            if isinstance(result, dict):
-                st.session_state.title = result.get("title", "")
-            else:
-                st.session_state.title = result
+            live = st.empty()  # partial output while the model is decoding
+            sections["title"] = semantic_cached("title", cached_title, abstract, _on_text=live.markdown)
+            live.empty()
             st.success("Done!")
         except Exception as e:
             st.error(f"❌ Title generation failed: {e}")
 
-if st.session_state.title:
+if sections["title"]:
     with st.expander("📘 Title"):
-        st.write(st.session_state.title)
+        st.write(sections["title"])
 
 
 if st.button("🔖 Generate Claims"):
     with st.spinner("Generating claims..."):
         try:
-            result = generate_claims_from_abstract(abstract)
-            if isinstance(result, dict):
-                st.session_state.claims = result.get("text", result.get("claims", ""))
-            else:
-                st.session_state.claims = result
+            live = st.empty()  # partial output while the model is decoding
+            sections["claims"] = semantic_cached("claims", cached_claims, abstract, _on_text=live.text)
+            live.empty()
             st.success("Done!")
         except Exception as e:
             st.error(f"❌ Claim generation failed: {e}")
 
-if st.session_state.claims:
+if sections["claims"]:
     with st.expander("🧾 Claims"):
-        st.write(st.session_state.claims)
+        with st.container(height=400):  # Fixed-height scroll area keeps long sections cheap to render
+            st.write(sections["claims"])
 
 
 if st.button("🧷 Generate Summary"):
     with st.spinner("Generating summary..."):
         try:
-            result = summarize_abstract(abstract)
-            if isinstance(result, dict):
-                st.session_state.summary = result.get("text", result.get("summary", ""))
-            else:
-                st.session_state.summary = result
+            live = st.empty()  # partial output while the model is decoding
+            sections["summary"] = semantic_cached("summary", cached_summary, abstract, _on_text=live.markdown)
+            live.empty()
             st.success("✅ Summary generated!")
         except Exception as e:
             st.error(f"❌ Summary generation failed: {e}")
 
-if st.session_state.summary:
+if sections["summary"]:
     with st.expander("📄 Summary"):
-        st.write(st.session_state.summary)
+        st.write(sections["summary"])
 
 
 if st.button("📚 Field of the Invention"):
     with st.spinner("Generating field of the invention..."):
         try:
-            result = generate_field_of_invention(abstract)
-            if isinstance(result, dict):
-                st.session_state.field_of_invention = result.get("text", result.get("field", ""))
-            else:
-                st.session_state.field_of_invention = result
+            live = st.empty()  # partial output while the model is decoding
+            sections["field_of_invention"] = semantic_cached("field_of_invention", cached_field, abstract, _on_text=live.markdown)
+            live.empty()
             st.success("Done!")
         except Exception as e:
             st.error(f"❌ Field generation failed: {e}")
 
-if st.session_state.field_of_invention:
+if sections["field_of_invention"]:
     with st.expander("📘 Field of the Invention"):
-        st.write(st.session_state.field_of_invention)
+        st.write(sections["field_of_invention"])
 
 
 if st.button("🧠 Background"):
     with st.spinner("Generating background..."):
         try:
-            result = generate_background_locally(abstract)
-            if isinstance(result, dict):
-                st.session_state.background = result.get("text", result.get("background", ""))
-            else:
-                st.session_state.background = result
+            live = st.empty()  # partial output while the model is decoding
+            sections["background"] = semantic_cached("background", cached_background, abstract, _on_text=live.markdown)
+            live.empty()
             st.success("Done!")
         except Exception as e:
             st.error(f"❌ Background generation failed: {e}")
 
-if st.session_state.background:
+if sections["background"]:
     with st.expander("🔍 Background"):
-        st.write(st.session_state.background)
+        with st.container(height=400):
+            st.write(sections["background"])
 
 
 if st.button("🎯 Objects of the Invention"):
     with st.spinner("Generating objects of the invention..."):
         try:
-            result = generate_objects_of_invention(abstract)
-            if isinstance(result, dict):
-                text = result.get("text", result.get("objects", ""))
-            else:
-                text = result
-            
-            # Clean markdown headers and formatting
-            import re
-            text = re.sub(r'^#+\s+', '', text, flags=re.MULTILINE)  # Remove markdown headers
-            text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # Remove bold
-            text = re.sub(r'__([^_]+)__', r'\1', text)  # Remove underline
-            
-            st.session_state.objects_of_invention = text
+            live = st.empty()  # partial output while the model is decoding
+            sections["objects_of_invention"] = semantic_cached("objects_of_invention", cached_objects, abstract, _on_text=live.text)
+            live.empty()
             st.success("Done!")
         except Exception as e:
             st.error(f"❌ Objects generation failed: {e}")
 
-if st.session_state.objects_of_invention:
+if sections["objects_of_invention"]:
     with st.expander("🎯 Objects of the Invention"):
-        st.text(st.session_state.objects_of_invention)  # Use st.text instead of st.write
+        st.text(sections["objects_of_invention"])  # Use st.text instead of st.write
 
 
 if st.button("📝 Detailed Description"):
     # Check if claims exist first
-    if not st.session_state.get("claims"):
+    if not sections.get("claims"):
         st.warning("⚠️ Please generate Claims first!")
     else:
         with st.spinner("Generating detailed description (this may take 30-60 seconds)..."):
             try:
                 # Get claims and drawing summary
-                claims_text = st.session_state.get("claims", "Claims not generated yet.")
+                claims_text = sections.get("claims", "Claims not generated yet.")
                 drawings_text = drawing_summary if drawing_summary and drawing_summary.strip() else "No drawings provided."
                 
                 # Debug info
@@ -175,38 +409,37 @@ if st.button("📝 Detailed Description"):
                 st.write(f"- Drawings length: {len(drawings_text)} chars")
                 
                 # Generate
-                result = generate_detailed_description(
+                live = st.empty()
+                text = cached_detailed_description(
                     abstract,
                     claims_text,
-                    drawings_text
+                    drawings_text,
+                    MODEL_VERSION,
+                    _on_text=live.markdown
                 )
-                
-                # Handle result
-                if isinstance(result, dict):
-                    text = result.get("text", result.get("description", ""))
-                else:
-                    text = result
+                live.empty()
                 
                 # Debug output
                 st.write(f"**Generated length:** {len(text)} characters")
                 
                 # Store
                 if text and len(text) > 50:
-                    st.session_state.detailed_description = text
+                    sections["detailed_description"] = text
                     st.success("✅ Done! Scroll down to see the detailed description.")
                 else:
-                    st.session_state.detailed_description = "⚠️ Generated description is too short or empty."
+                    sections["detailed_description"] = "⚠️ Generated description is too short or empty."
                     st.error("⚠️ Generated description is too short. Check model output.")
                     
             except Exception as e:
                 error_msg = f"❌ Exception: {str(e)}"
-                st.session_state.detailed_description = error_msg
+                sections["detailed_description"] = error_msg
                 st.error(f"❌ Detailed description generation failed: {e}")
                 st.exception(e)  # Show full traceback
 
-if st.session_state.get("detailed_description") and len(st.session_state.get("detailed_description", "")) > 50:
+if sections.get("detailed_description") and len(sections.get("detailed_description", "")) > 50:
     with st.expander("📘 Detailed Description", expanded=True):
-        st.markdown(st.session_state.detailed_description)
+        with st.container(height=400):
+            st.markdown(sections["detailed_description"])
 
 if st.button("📊 Brief Description of Drawings"):
     if not abstract or not drawing_summary:
@@ -214,18 +447,17 @@ if st.button("📊 Brief Description of Drawings"):
     else:
         with st.spinner("Generating brief description of drawings..."):
             try:
-                result = generate_brief_description(abstract, drawing_summary)
-                if isinstance(result, dict):
-                    st.session_state.brief_description = result.get("text", result.get("description", ""))
-                else:
-                    st.session_state.brief_description = result or "⚠️ No output generated."
+                live = st.empty()
+                text = cached_brief_description(abstract, drawing_summary, MODEL_VERSION, _on_text=live.text)
+                live.empty()
+                sections["brief_description"] = text or "⚠️ No output generated."
                 st.success("Done!")
             except Exception as e:
                 st.error(f"❌ Brief description generation failed: {e}")
 
-if st.session_state.get("brief_description"):
+if sections.get("brief_description"):
     with st.expander("🖼️ Brief Description of the Drawings"):
-        st.write(st.session_state.brief_description)
+        st.write(sections["brief_description"])
 
 
 if st.button("🖼️ Summary of Drawings"):
@@ -234,18 +466,40 @@ if st.button("🖼️ Summary of Drawings"):
     else:
         with st.spinner("Generating summary of drawings..."):
             try:
-                result = generate_drawing(abstract)
-                if isinstance(result, dict):
-                    st.session_state.summary_drawings = result.get("text", "")
-                else:
-                    st.session_state.summary_drawings = result or "⚠️ No output generated."
+                live = st.empty()
+                text = semantic_cached("summary_drawings", SECTION_TASKS["summary_drawings"], abstract, _on_text=live.text)
+                live.empty()
+                sections["summary_drawings"] = text or "⚠️ No output generated."
                 st.success("Done!")
             except Exception as e:
                 st.error(f"❌ Drawing summary failed: {e}")
 
-if st.session_state.get("summary_drawings"):
+if sections.get("summary_drawings"):
     with st.expander("📷 Summary of Drawings"):
-        st.write(st.session_state.summary_drawings)
+        st.write(sections["summary_drawings"])
+
+
+if st.button("🧩 Generate All Drawing Sections"):
+    if not abstract:
+        st.warning("Please enter the invention abstract.")
+    else:
+        with st.spinner("Generating brief description, summary of drawings and detailed description..."):
+            try:
+                live = st.empty()
+                bundle = cached_drawing_bundle(
+                    abstract,
+                    sections.get("claims", ""),
+                    drawing_summary,
+                    MODEL_VERSION,
+                    _on_text=live.text
+                )
+                live.empty()
+                for key, text in bundle.items():
+                    sections[key] = text or "⚠️ No output generated."
+            except Exception as e:
+                st.error(f"❌ Drawing sections generation failed: {e}")
+            else:
+                st.rerun()  # The section expanders are above this button
 
 
 # ------------------ CPC CLASSIFIER ----------------------
@@ -253,16 +507,17 @@ st.markdown("## 📚 CPC Classifier")
 if st.button("🏷️ Classify CPC"):
     with st.spinner("Classifying CPC..."):
         try:
+            from cpc_classifier import classify_cpc
             result = classify_cpc(abstract)
-            st.session_state.cpc_result = result or "⚠️ No result."
+            sections["cpc_result"] = result or "⚠️ No result."
             st.success("Done!")
         except Exception as e:
-            st.session_state.cpc_result = f"❌ Exception: {e}"
+            sections["cpc_result"] = f"❌ Exception: {e}"
             st.error(f"❌ CPC classification failed: {e}")
 
-if st.session_state.get("cpc_result"):
+if sections.get("cpc_result"):
     with st.expander("🔍 CPC Classification"):
-        st.code(st.session_state.cpc_result)
+        st.code(sections["cpc_result"])
 
 st.markdown("---")
 st.markdown("## 🔍 Patent Quality Verification")
@@ -270,8 +525,10 @@ st.info("🤖 6 AI Agents will analyze your patent for quality and compliance")
 
 if st.button("✅ Run 6-Agent Verification"):
     # Check if required sections exist
-    required = ['title', 'claims', 'abstract_input', 'background', 'summary']
-    missing = [s for s in required if not st.session_state.get(s)]
+    required = ['title', 'claims', 'background', 'summary']
+    missing = [s for s in required if not sections.get(s)]
+    if not st.session_state.get('abstract_input'):
+        missing.insert(2, 'abstract_input')
     
     if missing:
         st.warning(f"⚠️ Please generate these sections first: {', '.join(missing)}")
@@ -282,11 +539,11 @@ if st.button("✅ Run 6-Agent Verification"):
                 
                 # Prepare 5 critical sections for verification
                 sections_to_verify = {
-                    'title': st.session_state.get('title', ''),
+                    'title': sections.get("title", ''),
                     'abstract': st.session_state.get('abstract_input', ''),
-                    'claims': st.session_state.get('claims', ''),
-                    'background': st.session_state.get('background', ''),
-                    'summary': st.session_state.get('summary', '')
+                    'claims': sections.get("claims", ''),
+                    'background': sections.get("background", ''),
+                    'summary': sections.get("summary", '')
                 }
                 
                 # Run verification (this is where the real work happens)
@@ -321,18 +578,31 @@ st.markdown("## 📄 Export Patent Document")
 
 export_abstract = st.session_state.get("abstract_input", "")
 
-# ✅ CORRECT ORDER: Indian Patent Office Standard Structure
-pdf_sections = {
-    "Abstract": export_abstract or "[Not Provided]",  # 1. Abstract FIRST
-    "Title": st.session_state.get("title", "[Not Generated]"),  # 2. Title
-    "Field of the Invention": st.session_state.get("field_of_invention", "[Not Generated]"),  # 3. Field
-    "Background of the Invention": st.session_state.get("background", "[Not Generated]"),  # 4. Background
-    "Objects of the Invention": st.session_state.get("objects_of_invention", "[Not Generated]"),  # 5. Objects
-    "Summary of the Invention": st.session_state.get("summary", "[Not Generated]"),  # 6. Summary ✅ ADDED
-    "Brief Description of the Drawings": st.session_state.get("brief_description", "[Not Generated]"),  # 7. Brief Desc
-    "Detailed Description of the Invention": st.session_state.get("detailed_description", "[Not Generated]"),  # 8. Detailed
-    "Claims": st.session_state.get("claims", "[Not Generated]"),  # 9. Claims LAST
-}
+# Section keys in Indian Patent Office order (Abstract first, Claims last)
+EXPORT_KEYS = ("title", "field_of_invention", "background", "objects_of_invention", "summary",
+               "brief_description", "detailed_description", "claims")
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_export_sections(abstract, title, field, background, objects, summary, brief, detailed, claims):
+    """Assemble the export dict; only rebuilt when one of the section texts changes."""
+    # ✅ CORRECT ORDER: Indian Patent Office Standard Structure
+    return {
+        "Abstract": abstract or "[Not Provided]",  # 1. Abstract FIRST
+        "Title": title,  # 2. Title
+        "Field of the Invention": field,  # 3. Field
+        "Background of the Invention": background,  # 4. Background
+        "Objects of the Invention": objects,  # 5. Objects
+        "Summary of the Invention": summary,  # 6. Summary ✅ ADDED
+        "Brief Description of the Drawings": brief,  # 7. Brief Desc
+        "Detailed Description of the Invention": detailed,  # 8. Detailed
+        "Claims": claims,  # 9. Claims LAST
+    }
+
+
+pdf_sections = build_export_sections(
+    export_abstract, *(sections.get(key, "[Not Generated]") for key in EXPORT_KEYS)
+)
 
 st.session_state.generated_sections = pdf_sections
 
@@ -356,163 +626,178 @@ with st.expander("📋 Preview Export Sections (Indian Patent Office Order)"):
         word_count = len(content.split()) if content and content not in ["[Not Generated]", "[Not Provided]"] else 0
         st.write(f"{emoji} {status} **{section_name}**: {word_count} words")
 
-col1, col2 = st.columns(2)
 
-with col1:
-    st.markdown("### 🧾 Generate PDF")
-    if export_abstract.strip():
-        if st.button("📄 Generate PDF"):
-            with st.spinner("Creating PDF..."):
-                try:
-                    pdf_path = create_patent_pdf(pdf_sections)
-                    st.success("✅ PDF Generated!")
-                    with open(pdf_path, "rb") as f:
-                        st.download_button(
-                            label="📥 Download Patent PDF",
-                            data=f,
-                            file_name="patent_document.pdf",
-                            mime="application/pdf"
-                        )
-                except Exception as e:
-                    st.error(f"❌ PDF generation failed: {e}")
-                    st.info("💡 Check that create_patent_pdf() function exists and is working")
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_patent_docx(section_items):
+    """Build the Indian Patent Office DOCX; cached on the section texts so repeat clicks are free."""
+    from docx import Document
+    from docx.shared import Inches, Pt
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from io import BytesIO
+    
+    sections_by_name = dict(section_items)
+    
+    doc = Document()
+    
+    # Set margins (Indian Patent Office standard)
+    for section in doc.sections:
+        section.top_margin = Inches(1.0)
+        section.bottom_margin = Inches(1.0)
+        section.left_margin = Inches(1.0)
+        section.right_margin = Inches(1.0)
+    
+    # Set default font
+    style = doc.styles['Normal']
+    font = style.font
+    font.name = 'Times New Roman'
+    font.size = Pt(12)
+    paragraph_format = style.paragraph_format
+    paragraph_format.space_after = Pt(12)
+    paragraph_format.line_spacing = 1.5
+    
+    # Heading styles are defined once; paragraphs reference them instead of formatting each run
+    header_style = doc.styles.add_style('PatentHeader', WD_STYLE_TYPE.PARAGRAPH)
+    header_style.base_style = style
+    header_style.font.bold = True
+    
+    title_style = doc.styles.add_style('PatentTitle', WD_STYLE_TYPE.PARAGRAPH)
+    title_style.base_style = header_style
+    title_style.font.size = Pt(14)
+    title_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    # ========== PAGE 1: ABSTRACT (Standalone) ==========
+    doc.add_paragraph("ABSTRACT", style=header_style)
+    doc.add_paragraph(sections_by_name["Abstract"].strip())
+    
+    doc.add_page_break()  # New page after abstract
+    
+    # ========== PAGE 2+: TITLE (Centered) ==========
+    doc.add_paragraph(sections_by_name["Title"] or "TITLE OF THE INVENTION", style=title_style)
+    
+    doc.add_paragraph()
+    doc.add_paragraph()
+    
+    # ========== ALL OTHER SECTIONS IN ORDER ==========
+    patent_sections = [
+        ("FIELD OF THE INVENTION", "Field of the Invention"),
+        ("BACKGROUND OF THE INVENTION", "Background of the Invention"),
+        ("OBJECTS OF THE INVENTION", "Objects of the Invention"),
+        ("SUMMARY OF THE INVENTION", "Summary of the Invention"),  # ✅ INCLUDED
+        ("BRIEF DESCRIPTION OF THE DRAWINGS", "Brief Description of the Drawings"),
+        ("DETAILED DESCRIPTION OF THE INVENTION WITH REFERENCE TO THE ACCOMPANYING FIGURES", "Detailed Description of the Invention"),
+    ]
+    
+    for section_title, section_name in patent_sections:
+        # Section header (Bold, uppercase)
+        doc.add_paragraph(section_title, style=header_style)
+        
+        # Content
+        content = sections_by_name[section_name]
+        doc.add_paragraph(content.strip() if content and content.strip() else "[Not Generated]")
+        
+        doc.add_paragraph()  # Spacing between sections
+    
+    # ========== FINAL SECTION: CLAIMS (with WE CLAIM) ==========
+    doc.add_page_break()  # Claims on new page (optional but professional)
+    
+    doc.add_paragraph("CLAIMS", style=header_style)
+    
+    doc.add_paragraph()
+    
+    claims_content = sections_by_name["Claims"]
+    if claims_content and claims_content != "[Not Generated]":
+        # "WE CLAIM" for Indian Patent Office
+        doc.add_paragraph("WE CLAIM", style=header_style)
+        doc.add_paragraph()
+        doc.add_paragraph(claims_content.strip())
     else:
+        doc.add_paragraph("[Not Generated]")
+    
+    # Save to buffer
+    buffer = BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    
+    return buffer.getvalue()
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def build_patent_pdf(section_items):
+    """Render the PDF; cached on the section texts like the DOCX build."""
+    from export_to_pdf import create_patent_pdf
+    return create_patent_pdf(dict(section_items))
+
+
+@st.fragment
+def pdf_export_panel():
+    """PDF export; as a fragment its button reruns only this panel, not the whole app."""
+    st.markdown("### 🧾 Generate PDF")
+    export_sections = st.session_state.generated_sections
+    if not st.session_state.get("abstract_input", "").strip():
         st.warning("⚠️ Please enter an abstract before generating the PDF.")
+        return
 
-with col2:
-    st.markdown("### 📝 Export as DOCX")
-    if export_abstract.strip():
-        if st.button("📝 Generate Indian Patent Office DOCX"):
+    if st.button("📄 Generate PDF"):
+        with st.spinner("Creating PDF..."):
             try:
-                from docx import Document
-                from docx.shared import Inches, Pt
-                from docx.enum.text import WD_ALIGN_PARAGRAPH
-                from io import BytesIO
-                
-                doc = Document()
-                
-                # Set margins (Indian Patent Office standard)
-                sections = doc.sections
-                for section in sections:
-                    section.top_margin = Inches(1.0)
-                    section.bottom_margin = Inches(1.0)
-                    section.left_margin = Inches(1.0)
-                    section.right_margin = Inches(1.0)
-                
-                # Set default font
-                style = doc.styles['Normal']
-                font = style.font
-                font.name = 'Times New Roman'
-                font.size = Pt(12)
-                paragraph_format = style.paragraph_format
-                paragraph_format.space_after = Pt(12)
-                paragraph_format.line_spacing = 1.5
-                
-                # ========== PAGE 1: ABSTRACT (Standalone) ==========
-                abstract_header = doc.add_paragraph()
-                abstract_header_run = abstract_header.add_run("ABSTRACT")
-                abstract_header_run.bold = True
-                abstract_header_run.font.name = 'Times New Roman'
-                abstract_header_run.font.size = Pt(12)
-                
-                abstract_content = export_abstract or "[Not Provided]"
-                abstract_para = doc.add_paragraph(abstract_content.strip())
-                abstract_para.style = doc.styles['Normal']
-                
-                doc.add_page_break()  # New page after abstract
-                
-                # ========== PAGE 2+: TITLE (Centered) ==========
-                title_para = doc.add_paragraph()
-                title_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                title_run = title_para.add_run(st.session_state.get("title", "TITLE OF THE INVENTION"))
-                title_run.bold = True
-                title_run.font.name = 'Times New Roman'
-                title_run.font.size = Pt(14)
-                
-                doc.add_paragraph()
-                doc.add_paragraph()
-                
-                # ========== ALL OTHER SECTIONS IN ORDER ==========
-                patent_sections = [
-                    ("FIELD OF THE INVENTION", "field_of_invention"),
-                    ("BACKGROUND OF THE INVENTION", "background"),
-                    ("OBJECTS OF THE INVENTION", "objects_of_invention"),
-                    ("SUMMARY OF THE INVENTION", "summary"),  # ✅ INCLUDED
-                    ("BRIEF DESCRIPTION OF THE DRAWINGS", "brief_description"),
-                    ("DETAILED DESCRIPTION OF THE INVENTION WITH REFERENCE TO THE ACCOMPANYING FIGURES", "detailed_description"),
-                ]
-                
-                for section_title, session_key in patent_sections:
-                    # Section header (Bold, uppercase)
-                    header = doc.add_paragraph()
-                    header_run = header.add_run(section_title)
-                    header_run.bold = True
-                    header_run.font.name = 'Times New Roman'
-                    header_run.font.size = Pt(12)
-                    
-                    # Get content
-                    content = st.session_state.get(session_key, "[Not Generated]")
-                    
-                    # Add content
-                    content_para = doc.add_paragraph(content.strip() if content and content.strip() else "[Not Generated]")
-                    content_para.style = doc.styles['Normal']
-                    
-                    doc.add_paragraph()  # Spacing between sections
-                
-                # ========== FINAL SECTION: CLAIMS (with WE CLAIM) ==========
-                doc.add_page_break()  # Claims on new page (optional but professional)
-                
-                claims_header = doc.add_paragraph()
-                claims_header_run = claims_header.add_run("CLAIMS")
-                claims_header_run.bold = True
-                claims_header_run.font.name = 'Times New Roman'
-                claims_header_run.font.size = Pt(12)
-                
-                doc.add_paragraph()
-                
-                claims_content = st.session_state.get("claims", "[Not Generated]")
-                if claims_content and claims_content != "[Not Generated]":
-                    # "WE CLAIM" for Indian Patent Office
-                    we_claim_para = doc.add_paragraph()
-                    we_claim_run = we_claim_para.add_run("WE CLAIM")
-                    we_claim_run.bold = True
-                    we_claim_run.font.name = 'Times New Roman'
-                    we_claim_run.font.size = Pt(12)
-                    
-                    doc.add_paragraph()
-                    
-                    claims_para = doc.add_paragraph(claims_content.strip())
-                    claims_para.style = doc.styles['Normal']
-                else:
-                    not_gen_para = doc.add_paragraph("[Not Generated]")
-                    not_gen_para.style = doc.styles['Normal']
-                
-                # Save to buffer
-                buffer = BytesIO()
-                doc.save(buffer)
-                buffer.seek(0)
-                
-                st.download_button(
-                    label="📥 Download Indian Patent Office DOCX",
-                    data=buffer,
-                    file_name="patent_application_indian_format.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
-                
-                st.success("✅ Indian Patent Office DOCX generated successfully!")
-                st.info("📋 Structure: Abstract (Page 1) → Title → 7 Sections → Claims (Final)")
-                
+                st.session_state._pdf_export = (export_sections, build_patent_pdf(tuple(export_sections.items())))
+                st.success("✅ PDF Generated!")
             except Exception as e:
-                st.error(f"❌ DOCX generation failed: {e}")
-                st.info("💡 Make sure python-docx is installed: pip install python-docx")
-                import traceback
-                st.code(traceback.format_exc())
-    else:
+                st.error(f"❌ PDF generation failed: {e}")
+                st.info("💡 Check that create_patent_pdf() function exists and is working")
+
+    # Keep offering the last PDF until one of the sections changes
+    built_from, pdf_bytes = st.session_state.get("_pdf_export", (None, None))
+    if built_from == export_sections:
+        st.download_button(
+            label="📥 Download Patent PDF",
+            data=pdf_bytes,
+            file_name="patent_document.pdf",
+            mime="application/pdf"
+        )
+
+
+@st.fragment
+def docx_export_panel():
+    """DOCX export; as a fragment its button reruns only this panel, not the whole app."""
+    st.markdown("### 📝 Export as DOCX")
+    export_sections = st.session_state.generated_sections
+    if not st.session_state.get("abstract_input", "").strip():
         st.warning("⚠️ Please enter an abstract before generating the DOCX.")
+        return
+
+    if st.button("📝 Generate Indian Patent Office DOCX"):
+        try:
+            st.session_state._docx_export = (export_sections, build_patent_docx(tuple(export_sections.items())))
+            st.success("✅ Indian Patent Office DOCX generated successfully!")
+            st.info("📋 Structure: Abstract (Page 1) → Title → 7 Sections → Claims (Final)")
+        except Exception as e:
+            st.error(f"❌ DOCX generation failed: {e}")
+            st.info("💡 Make sure python-docx is installed: pip install python-docx")
+            import traceback
+            st.code(traceback.format_exc())
+
+    built_from, docx_bytes = st.session_state.get("_docx_export", (None, None))
+    if built_from == export_sections:
+        st.download_button(
+            label="📥 Download Indian Patent Office DOCX",
+            data=docx_bytes,
+            file_name="patent_application_indian_format.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+
+
+col1, col2 = st.columns(2)
+
+with col1:
+    pdf_export_panel()
+
+with col2:
+    docx_export_panel()
 
 st.markdown("---")
 
 if st.button("🔄 Reset All"):
-    for key in list(st.session_state.keys()):
-        del st.session_state[key]
+    st.session_state.clear()
     st.rerun()
@@ -0,0 +1,7 @@
+from cpc_classifier import CPC_EMBEDDINGS_FILE, build_cpc_embeddings
+
+# Encode the CPC label descriptions once so cpc_classifier can memory-map them on startup
+print("🧠 Encoding CPC label descriptions...")
+cpc_matrix = build_cpc_embeddings()
+
+print(f"✅ Saved {cpc_matrix.shape[0]} CPC embeddings to {CPC_EMBEDDINGS_FILE}")
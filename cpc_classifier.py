@@ -2,52 +2,112 @@ from transformers import BertForSequenceClassification, BertTokenizer
 import torch
 import json
 import os
+from functools import lru_cache
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import streamlit as st
 
-# Load tokenizer
-tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-
-# Load your fine-tuned model (using BertForSequenceClassification)
+# Path to your fine-tuned model checkpoint
 model_path = "./models/best_patentbert_cpc_model.pt"  # relative path
 
-model = BertForSequenceClassification.from_pretrained('bert-base-uncased', num_labels=4)
-
-# Load checkpoint and extract 'model_state_dict'
-checkpoint = torch.load(model_path)
-model.load_state_dict(checkpoint["model_state_dict"])
-
 # Path to CPC label dataset
 CPC_FILE = "data/cpc_labels.json"
 
-if not os.path.isfile(CPC_FILE):
-    raise FileNotFoundError("❌ CPC label file not found. Please provide 'data/cpc_labels.json'.")
+# Label embeddings cached on disk (rebuilt whenever cpc_labels.json is newer)
+CPC_EMBEDDINGS_FILE = "data/cpc_embeddings.npy"
 
-# Load CPC data
-with open(CPC_FILE, "r") as f:
-    cpc_data = json.load(f)
+# Half precision on GPU (tensor cores, half the memory); CPU stays in fp32
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+DTYPE = torch.float16 if DEVICE == "cuda" else torch.float32
 
-def encode(text: str):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
+
+@lru_cache(maxsize=1)
+def _load_cpc_data():
+    """Read the CPC labels on first use, so importing this module never touches the file."""
+    if not os.path.isfile(CPC_FILE):
+        raise FileNotFoundError("❌ CPC label file not found. Please provide 'data/cpc_labels.json'.")
+    with open(CPC_FILE, "r") as f:
+        return json.load(f)
+
+
+@st.cache_resource(show_spinner=False)
+def load_cpc_model():
+    """Load the tokenizer and fine-tuned BERT once per process (not on every Streamlit rerun)."""
+    tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
+
+    # Load your fine-tuned model (using BertForSequenceClassification)
+    model = BertForSequenceClassification.from_pretrained('bert-base-uncased', num_labels=4)
+
+    # Load checkpoint and extract 'model_state_dict'
+    checkpoint = torch.load(model_path, map_location="cpu")
+    model.load_state_dict(checkpoint["model_state_dict"])
+    model = model.to(device=DEVICE, dtype=DTYPE).eval()  # eval(): no dropout at inference
+    return tokenizer, model
+
+
+def encode_tensor(texts):
+    """Mean-pooled BERT embeddings as a (N, 768) tensor, left on DEVICE in DTYPE."""
+    tokenizer, model = load_cpc_model()
+    inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding=True).to(DEVICE)
+    with torch.inference_mode():
         outputs = model.bert(**inputs)
-    embedding = outputs.last_hidden_state.mean(dim=1).squeeze().cpu().numpy()
-    return embedding
+    # Average over real tokens only, so padding does not change the embedding
+    mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+    return (outputs.last_hidden_state * mask).sum(dim=1) / mask.sum(dim=1)
+
+
+def encode_batch(texts):
+    """Mean-pooled BERT embeddings for several texts in one forward pass, shape (N, 768)."""
+    return encode_tensor(texts).float().cpu().numpy()
+
+
+def encode(text: str):
+    return encode_batch([text])[0]
+
+
+def build_cpc_embeddings():
+    """Encode every CPC description and save the (N, 768) float16 matrix to CPC_EMBEDDINGS_FILE."""
+    cpc_matrix = encode_batch([item["description"] for item in _load_cpc_data()]).astype(np.float16)
+    np.save(CPC_EMBEDDINGS_FILE, cpc_matrix)
+    return cpc_matrix
+
+
+@st.cache_resource(show_spinner=False)
+def load_cpc_embeddings():
+    """Load CPC embeddings once per process: codes, descriptions and the L2-normalized (N, 768) matrix on DEVICE."""
+    cpc_data = _load_cpc_data()
+    codes = [item["code"] for item in cpc_data]
+    descriptions = [item["description"] for item in cpc_data]
+
+    # Memory-map the saved matrix when it is up to date; only encode when it is not
+    cpc_matrix = None
+    if os.path.isfile(CPC_EMBEDDINGS_FILE) and os.path.getmtime(CPC_EMBEDDINGS_FILE) >= os.path.getmtime(CPC_FILE):
+        cpc_matrix = np.load(CPC_EMBEDDINGS_FILE, mmap_mode="r")
+        if cpc_matrix.shape[0] != len(codes):
+            cpc_matrix = None
+    if cpc_matrix is None:
+        cpc_matrix = build_cpc_embeddings()
+
+    # Normalize once in fp32, then keep the matrix on the device the query is encoded on
+    cpc_matrix = torch.nn.functional.normalize(torch.from_numpy(np.asarray(cpc_matrix, dtype=np.float32)), dim=1)
+    return codes, descriptions, cpc_matrix.to(device=DEVICE, dtype=DTYPE)
+
+
+def classify_cpc_batch(abstracts, batch_size: int = 32):
+    """Classify several abstracts, encoding up to batch_size of them per forward pass."""
+    codes, descriptions, cpc_matrix = load_cpc_embeddings()
+    results = []
+    for start in range(0, len(abstracts), batch_size):
+        query = torch.nn.functional.normalize(encode_tensor(abstracts[start:start + batch_size]), dim=1)
+        # Cosine similarity of every abstract against every label in one (B, D) @ (D, N) matmul;
+        # only the winning indices and scores leave the device
+        scores, best = (query @ cpc_matrix.T).max(dim=1)
+        for score, idx in zip(scores.tolist(), best.tolist()):
+            results.append(f"[{codes[idx]}] - {descriptions[idx]}\nReason: Highest semantic similarity score ({score:.3f})")
+    return results
 
-# Precompute CPC embeddings
-cpc_embeddings = []
-for item in cpc_data:
-    emb = encode(item["description"])
-    cpc_embeddings.append((item["code"], item["description"], emb))
 
 def classify_cpc(abstract: str):
-    abstract_emb = encode(abstract)
-    similarities = []
-    for code, desc, emb in cpc_embeddings:
-        sim = cosine_similarity([abstract_emb], [emb])[0][0]
-        similarities.append((code, desc, sim))
-    best_match = max(similarities, key=lambda x: x[2])
-    return f"[{best_match[0]}] - {best_match[1]}\nReason: Highest semantic similarity score ({best_match[2]:.3f})"
+    return classify_cpc_batch([abstract])[0]
 
 if __name__ == "__main__":
     test_abstract = "A method for processing digital data using electrical circuits"
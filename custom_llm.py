@@ -3,12 +3,17 @@ Custom LLM wrapper for CrewAI - FINAL WORKING VERSION
 Uses Pydantic v2 with proper configuration
 """
 
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List, Optional, Dict
 from langchain.llms.base import LLM
 from langchain.callbacks.manager import CallbackManagerForLLMRun
 from langchain_core.outputs import LLMResult, Generation
 from llama_cpp import Llama as LlamaCppModel
-from pydantic import model_validator
+from pydantic import Field, PrivateAttr
+
+from llm_loader import LLM_PATH, LLM_SERVER_URL, N_THREADS, LlamaServerClient, get_llm, run_completion
 
 
 class CustomLlamaCpp(LLM):
@@ -20,27 +25,40 @@ class CustomLlamaCpp(LLM):
         "extra": "allow"
     }
     
-    # Fields
-    model_path: str = ""
-    n_ctx: int = 4096
-    n_threads: int = 4
+    # Fields (the model settings are frozen: they are read once, when the model is loaded)
+    model_path: str = Field(default="", frozen=True)
+    n_ctx: int = Field(default=4096, frozen=True)
+    n_threads: int = Field(default=N_THREADS, frozen=True)
     temperature: float = 0.3
     max_tokens: int = 512
-    _llm: Optional[Any] = None
+    # llama-server URL; when set, prompts go over HTTP and batches are decoded together
+    server_url: str = Field(default=LLM_SERVER_URL, frozen=True)
+    # Optional regex: decoding stops as soon as the output so far matches it, and the text up
+    # to the end of the match is returned (e.g. r"Final Answer:[^\n]+\n" for one-line answers)
+    early_stop_pattern: Optional[str] = None
+    _llm: Optional[Any] = PrivateAttr(default=None)
     
-    @model_validator(mode='after')
-    def load_model(self):
-        """Load the model after validation"""
-        if self.model_path and self._llm is None:
-            print(f"🔄 Loading model from: {self.model_path}")
-            self._llm = LlamaCppModel(
-                model_path=self.model_path,
-                n_ctx=self.n_ctx,
-                n_threads=self.n_threads,
-                verbose=False
-            )
-            print(f"✅ Model loaded successfully!")
-        return self
+    @property
+    def llm(self):
+        """The backend, created on first use (never on Pydantic validation or copies)"""
+        if self._llm is None:
+            if self.server_url:
+                self._llm = LlamaServerClient(self.server_url)
+            elif self.model_path and os.path.realpath(self.model_path) == os.path.realpath(LLM_PATH):
+                # Same GGUF as the section generators: share their instance (n_ctx 8192)
+                # instead of holding a second copy of the weights and KV cache
+                self._llm = get_llm()
+            elif self.model_path:
+                print(f"🔄 Loading model from: {self.model_path}")
+                self._llm = LlamaCppModel(
+                    model_path=self.model_path,
+                    n_ctx=self.n_ctx,
+                    n_threads=self.n_threads,
+                    n_threads_batch=self.n_threads,
+                    verbose=False
+                )
+                print(f"✅ Model loaded successfully!")
+        return self._llm
     
     @property
     def _llm_type(self) -> str:
@@ -55,13 +73,16 @@ class CustomLlamaCpp(LLM):
         **kwargs: Any,
     ) -> LLMResult:
         """Generate responses for multiple prompts"""
-        generations = []
+        if len(prompts) > 1 and isinstance(self.llm, LlamaServerClient):
+            # llama-server (--parallel N --cont-batching) decodes concurrent requests in one
+            # batch, so the weights are read once per step for all prompts
+            with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+                texts = list(executor.map(lambda prompt: self._call_model(prompt, stop), prompts))
+        else:
+            # A single in-process llama.cpp context decodes one sequence at a time
+            texts = [self._call_model(prompt, stop) for prompt in prompts]
         
-        for prompt in prompts:
-            text = self._call_model(prompt, stop)
-            generations.append([Generation(text=text)])
-        
-        return LLMResult(generations=generations)
+        return LLMResult(generations=[[Generation(text=text)] for text in texts])
     
     def _call(
         self,
@@ -76,23 +97,33 @@ class CustomLlamaCpp(LLM):
     def _call_model(self, prompt: str, stop: Optional[List[str]] = None) -> str:
         """Internal method to call the model"""
         try:
-            response = self._llm(
-                prompt,
+            params = dict(
                 max_tokens=self.max_tokens,
                 temperature=self.temperature,
                 top_p=0.9,
                 stop=stop or [],
                 echo=False
             )
+            if self.early_stop_pattern:
+                return self._stream_until_match(prompt, params)
             
-            if isinstance(response, dict) and "choices" in response:
-                return response["choices"][0]["text"].strip()
-            return str(response).strip()
+            # run_completion queues the call on the model lock shared with the section generators
+            return run_completion(self.llm, prompt, **params).strip()
                 
         except Exception as e:
             print(f"❌ LLM call failed: {e}")
             return f"Error: {str(e)}"
     
+    def _stream_until_match(self, prompt: str, params: Dict[str, Any]) -> str:
+        """Stream the completion and stop decoding once early_stop_pattern matches."""
+        pattern = re.compile(self.early_stop_pattern)
+        text = run_completion(self.llm, prompt, should_stop=lambda text: pattern.search(text) is not None,
+                              **params)
+        match = pattern.search(text)
+        if match:
+            text = text[:match.end()]
+        return text.strip()
+    
     @property
     def _identifying_params(self) -> Dict[str, Any]:
         """Return parameters that identify this LLM"""
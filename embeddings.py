@@ -0,0 +1,32 @@
+"""
+Shared sentence-embedding model (all-MiniLM-L6-v2) for prior-art retrieval,
+the semantic response cache and the FAISS index build.
+"""
+
+import os
+import platform
+from functools import lru_cache
+
+
+# Must match the model the FAISS index in data/bigpatent_tiny was built with
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # 384-dimensional output
+
+# PATENTDOC_EMBEDDING_BACKEND=onnx runs MiniLM through ONNX Runtime with the dynamically
+# int8-quantized weights published in the model repo (needs onnxruntime and optimum): no
+# PyTorch dispatch per op and a quarter of the weight bandwidth, for CPU-only servers.
+# Opt-in only, because queries must be embedded like the corpus: the prior-art FAISS index
+# is built with the default fp32 "torch" encoder, so rebuild it (build_faiss_index.py) with
+# the same setting after switching.
+EMBEDDING_BACKEND = os.environ.get("PATENTDOC_EMBEDDING_BACKEND", "torch")
+ONNX_INT8_FILE = ("onnx/model_qint8_arm64.onnx" if platform.machine().lower() in ("arm64", "aarch64")
+                  else "onnx/model_quint8_avx2.onnx")
+
+
+@lru_cache(maxsize=1)
+def get_embedder():
+    """Load MiniLM once per process (on GPU when available) and share it between modules."""
+    from sentence_transformers import SentenceTransformer
+    if EMBEDDING_BACKEND == "onnx":
+        return SentenceTransformer(EMBEDDING_MODEL, backend="onnx",
+                                   model_kwargs={"file_name": ONNX_INT8_FILE})
+    return SentenceTransformer(EMBEDDING_MODEL)
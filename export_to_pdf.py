@@ -3,9 +3,12 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from datetime import datetime
+from io import BytesIO
 
-def create_patent_pdf(sections, output_path="generated_patent.pdf"):
-    doc = SimpleDocTemplate(output_path, pagesize=A4,
+def create_patent_pdf(sections) -> bytes:
+    """Build the patent PDF in memory and return its bytes (ready for st.download_button)."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4,
                             rightMargin=72, leftMargin=72,
                             topMargin=72, bottomMargin=72)
 
@@ -29,4 +32,4 @@ def create_patent_pdf(sections, output_path="generated_patent.pdf"):
     story.append(footer)
 
     doc.build(story)
-    return output_path
+    return buffer.getvalue()
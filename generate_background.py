@@ -1,21 +1,101 @@
-from llama_cpp import Llama
+import hashlib
+import json
+import os
 import re
+import sys
+import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, List
 
+from llm_loader import (MODEL_VERSION, LlamaServerClient, get_fast_llm, model_identity, run_completion,
+                        terminal_stream)
 
-# Path to your GGUF model
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
 
+# Finished results for the default model, one JSON file per (abstract, prompt, model)
+CACHE_DIR = os.path.join(
+    os.environ.get("PATENTDOC_CACHE_DIR", os.path.expanduser("~/.cache/patentdoc")), "background"
+)
+CACHE_VERSION = 1  # Bump when the prompt tail or post-processing changes
+
+
+# Patterns used on every generated background (up to max_attempts times per request)
+# A heading the LLM added, then a "[n]" paragraph number, at the start of a line. Two passes:
+# removing a heading can bring a number to the start of a line, and one combined pattern
+# would also strip repeats that the trailing \s* runs into
+_RE_HEADER = re.compile(r'^(Background of the Invention:|BACKGROUND OF THE INVENTION:?)\s*', re.IGNORECASE | re.MULTILINE)
+_RE_PARA_NUM = re.compile(r'^\[\d+\]\s*', re.MULTILINE)
+_RE_MULTI_SP = re.compile(r' +')
+# A whitespace run holding a blank line separates paragraphs; it becomes exactly "\n\n"
+_RE_PARAGRAPH_BREAK = re.compile(r'\s*\n\n\s*')
+_RE_BLANK_LINES = re.compile(r'\n\s*\n')  # Any run of blank or whitespace-only lines
+_RE_PARAGRAPH_START = re.compile(r'(?:\A|(?<=\n\n))\S')
+_RE_MISSING_PERIOD = re.compile(r'(?<!\.)(?=\n\n|\Z)')
+_RE_STATS = re.compile(r'\d+%|\d+ per year|\d+ deaths|\d+ increase')
+_RE_PRIORART = re.compile(r'(CN|IN|US|KR|DE)\d{6,}|Non-patent literature')
+
+EXISTING_TECH_PHRASES = (
+    'existing', 'current', 'conventional', 'traditional', 'prior art',
+    'known', 'typical', 'commonly', 'previously', 'presently'
+)
+PROBLEM_PHRASES = (
+    'problem', 'limitation', 'drawback', 'disadvantage', 'difficulty',
+    'challenge', 'suffer', 'inadequate', 'inefficient', 'lack', 'fail'
+)
+NEED_PHRASES = (
+    'need', 'desire', 'would be', 'therefore', 'accordingly',
+    'desirable', 'beneficial', 'accordingly, there exists'
+)
+PROHIBITED_PHRASES = (
+    'the present invention solves', 'our invention', 'we developed',
+    'we created', 'my invention', 'this invention addresses'
+)
 
 
-# Load the model ONCE with optimized settings
-llm = Llama(
-    model_path=LLM_PATH, device="auto",
-    n_ctx=6144,  # Increased for longer background sections
-    n_threads=4,
-    n_batch=512,
-    verbose=False
-)
+NEED_ISSUE = "Must end with statement of need (e.g., 'Accordingly, there exists a need...')."
+NEED_OPENING = "Accordingly, there exists a need for"
+
+
+def _phrase_pattern(phrases) -> re.Pattern:
+    """One alternation over the phrases, so a single scan answers "does any occur?"."""
+    return re.compile('|'.join(map(re.escape, phrases)))
+
+
+_RE_PROHIBITED_ANY_CASE = re.compile(_phrase_pattern(PROHIBITED_PHRASES).pattern, re.IGNORECASE)
+
+# All validation phrases in one alternation, so validate_background finds every category in a
+# single scan. As with _RE_KEYWORDS below, the lookahead reports overlapping occurrences and
+# _PHRASE_PREFIXES adds back shorter phrases that start a longer match.
+_VALIDATION_PHRASES = sorted(set(EXISTING_TECH_PHRASES + PROBLEM_PHRASES + NEED_PHRASES + PROHIBITED_PHRASES),
+                             key=len, reverse=True)
+_RE_VALIDATION_PHRASES = re.compile('(?=(' + '|'.join(map(re.escape, _VALIDATION_PHRASES)) + '))')
+_PHRASE_PREFIXES = {phrase: {p for p in _VALIDATION_PHRASES if phrase.startswith(p)} for phrase in _VALIDATION_PHRASES}
+
+# Characters re-scanned per streamed token: longer than any prohibited phrase plus one token
+_STREAM_WINDOW = 80
+
+
+# Abstract keywords that identify the domain (first matching domain wins)
+DOMAIN_KEYWORDS = {
+    'wildlife conservation': ['wildlife', 'animal', 'conflict', 'elephant', 'conservation'],
+    'agriculture': ['agricultural', 'farm', 'crop', 'soil', 'irrigation'],
+    'healthcare': ['medical', 'patient', 'diagnosis', 'clinical', 'health'],
+    'industrial': ['industrial', 'manufacturing', 'monitoring', 'safety'],
+    'smart city': ['urban', 'city', 'infrastructure', 'traffic']
+}
+
+TECH_PATTERNS = [
+    'IoT', 'LoRaWAN', 'GSM', 'AI', 'machine learning', 'TinyML',
+    'edge computing', 'cloud', 'sensor', 'wireless'
+]
+
+# Every keyword and technology in one alternation, scanned once per abstract. The lookahead
+# reports overlapping occurrences ("aiot" holds both "ai" and "iot"); longer terms are tried
+# first, and _PREFIX_TERMS adds back shorter terms that are prefixes of a longer match.
+_KEYWORD_TERMS = sorted({kw for kws in DOMAIN_KEYWORDS.values() for kw in kws} |
+                        {tech.lower() for tech in TECH_PATTERNS}, key=len, reverse=True)
+_RE_KEYWORDS = re.compile('(?=(' + '|'.join(map(re.escape, _KEYWORD_TERMS)) + '))')
+_PREFIX_TERMS = {term: {t for t in _KEYWORD_TERMS if term.startswith(t)} for term in _KEYWORD_TERMS}
 
 
 def extract_domain_statistics(abstract: str) -> Dict[str, any]:
@@ -30,64 +110,34 @@ def extract_domain_statistics(abstract: str) -> Dict[str, any]:
         'application': ''
     }
     
-    abstract_lower = abstract.lower()
+    found = set()
+    for term in _RE_KEYWORDS.findall(abstract.lower()):
+        found |= _PREFIX_TERMS[term]
     
     # Detect domain
-    domains = {
-        'wildlife conservation': ['wildlife', 'animal', 'conflict', 'elephant', 'conservation'],
-        'agriculture': ['agricultural', 'farm', 'crop', 'soil', 'irrigation'],
-        'healthcare': ['medical', 'patient', 'diagnosis', 'clinical', 'health'],
-        'industrial': ['industrial', 'manufacturing', 'monitoring', 'safety'],
-        'smart city': ['urban', 'city', 'infrastructure', 'traffic']
-    }
-    
-    for domain, keywords in domains.items():
-        if any(kw in abstract_lower for kw in keywords):
+    for domain, keywords in DOMAIN_KEYWORDS.items():
+        if found.intersection(keywords):
             domain_info['domain'] = domain
             break
     
     # Extract technologies
-    tech_patterns = [
-        'IoT', 'LoRaWAN', 'GSM', 'AI', 'machine learning', 'TinyML',
-        'edge computing', 'cloud', 'sensor', 'wireless'
-    ]
-    
-    for tech in tech_patterns:
-        if tech.lower() in abstract_lower:
-            domain_info['technologies'].append(tech)
+    domain_info['technologies'] = [tech for tech in TECH_PATTERNS if tech.lower() in found]
     
     return domain_info
 
 
 def clean_background_text(text: str) -> str:
     """Clean and format the generated background text."""
-    # Remove header if LLM added it
-    text = re.sub(r'^(Background of the Invention:|BACKGROUND OF THE INVENTION:?)\s*', '', text, flags=re.IGNORECASE | re.MULTILINE)
-    
-    # Remove paragraph numbers if added
-    text = re.sub(r'^\[\d+\]\s*', '', text, flags=re.MULTILINE)
-    
-    # Normalize whitespace
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    text = re.sub(r' +', ' ', text)
-    
-    # Ensure proper paragraph structure
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    cleaned_paragraphs = []
+    # Remove header and paragraph numbers if the LLM added them, then collapse runs of spaces
+    text = _RE_MULTI_SP.sub(' ', _RE_PARA_NUM.sub('', _RE_HEADER.sub('', text)))
     
-    for para in paragraphs:
-        # Capitalize first letter
-        if para and not para[0].isupper():
-            para = para[0].upper() + para[1:]
-        
-        # Ensure ends with period
-        if para and not para.endswith('.'):
-            para += '.'
-        
-        if para:
-            cleaned_paragraphs.append(para)
-    
-    return '\n\n'.join(cleaned_paragraphs)
+    # Normalize paragraph breaks, then capitalize the first letter of every paragraph and
+    # make sure each one ends with a period, one substitution over the whole text for each
+    text = _RE_PARAGRAPH_BREAK.sub('\n\n', text.strip())
+    if not text:
+        return text
+    text = _RE_PARAGRAPH_START.sub(lambda m: m.group().upper(), text)
+    return _RE_MISSING_PERIOD.sub('.', text)
 
 
 def validate_background(text: str) -> Dict[str, any]:
@@ -95,10 +145,22 @@ def validate_background(text: str) -> Dict[str, any]:
     Validate background section against Indian Patent Office standards.
     Real patent has: 600+ words, 10+ paragraphs, statistics, prior art citations.
     """
+    # Retries at low temperature often reproduce an earlier text; those are not scanned again.
+    # The lists are copied so callers can never modify a cached report.
+    report = _validate_background(text)
+    return {key: list(value) if isinstance(value, list) else value for key, value in report.items()}
+
+
+@lru_cache(maxsize=64)
+def _validate_background(text: str) -> Dict[str, any]:
+    """Uncached body of validate_background."""
     issues = []
     warnings = []
     
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    # Paragraphs are separated by blank lines; runs of them (and whitespace-only lines) in
+    # raw or externally supplied text still count as one break
+    text = text.strip()
+    paragraph_count = len(_RE_BLANK_LINES.split(text)) if text else 0
     word_count = len(text.split())
     
     # Check length (real patent background: ~650 words, 11 paragraphs)
@@ -108,39 +170,35 @@ def validate_background(text: str) -> Dict[str, any]:
         warnings.append("Background is lengthy (>1000 words). Consider condensing.")
     
     # Check paragraph count (real patent has 10+ paragraphs)
-    if len(paragraphs) < 5:
+    if paragraph_count < 5:
         issues.append("Background should have 5-12 paragraphs covering problem, existing solutions, prior art, limitations.")
     
     # Check for required elements
     text_lower = text.lower()
     
     # Problem statement with statistics (real patent has specific numbers)
-    has_statistics = bool(re.search(r'\d+%|\d+ per year|\d+ deaths|\d+ increase', text))
+    has_statistics = bool(_RE_STATS.search(text))
     if not has_statistics:
         warnings.append("Consider adding statistics or quantitative data about the problem (e.g., '35% increase', '464 per year').")
     
+    # Every existing-tech/problem/need/prohibited phrase that occurs, from one scan
+    found = set()
+    for match in _RE_VALIDATION_PHRASES.finditer(text_lower):
+        found |= _PHRASE_PREFIXES[match.group(1)]
+    
     # Existing technology discussion
-    has_existing_tech = any(phrase in text_lower for phrase in [
-        'existing', 'current', 'conventional', 'traditional', 'prior art',
-        'known', 'typical', 'commonly', 'previously', 'presently'
-    ])
+    has_existing_tech = not found.isdisjoint(EXISTING_TECH_PHRASES)
     
     # Problems/limitations
-    has_problems = any(phrase in text_lower for phrase in [
-        'problem', 'limitation', 'drawback', 'disadvantage', 'difficulty',
-        'challenge', 'suffer', 'inadequate', 'inefficient', 'lack', 'fail'
-    ])
+    has_problems = not found.isdisjoint(PROBLEM_PHRASES)
     
     # Prior art citations (real patent cites specific patents and papers)
-    has_prior_art_citations = bool(re.search(r'(CN|IN|US|KR|DE)\d{6,}|Non-patent literature', text))
+    has_prior_art_citations = bool(_RE_PRIORART.search(text))
     if not has_prior_art_citations:
         warnings.append("Consider citing specific prior art (e.g., CN109510971A, IN202041057018).")
     
     # Need statement
-    has_need = any(phrase in text_lower for phrase in [
-        'need', 'desire', 'would be', 'therefore', 'accordingly',
-        'desirable', 'beneficial', 'accordingly, there exists'
-    ])
+    has_need = not found.isdisjoint(NEED_PHRASES)
     
     if not has_existing_tech:
         issues.append("Missing discussion of existing technology/prior art.")
@@ -149,16 +207,12 @@ def validate_background(text: str) -> Dict[str, any]:
         issues.append("Should identify problems or limitations with existing technology.")
     
     if not has_need:
-        issues.append("Must end with statement of need (e.g., 'Accordingly, there exists a need...').")
+        issues.append(NEED_ISSUE)
     
     # Check for prohibited content (describing your own invention)
-    prohibited_phrases = [
-        'the present invention solves', 'our invention', 'we developed',
-        'we created', 'my invention', 'this invention addresses'
-    ]
-    
-    for phrase in prohibited_phrases:
-        if phrase in text_lower:
+    # Report each phrase once, in PROHIBITED_PHRASES order as before
+    for phrase in PROHIBITED_PHRASES:
+        if phrase in found:
             issues.append(f"Avoid describing your own invention in Background. Found: '{phrase}'")
     
     # Check structure (real patent has: problem → existing tech → limitations → prior art → need)
@@ -171,7 +225,7 @@ def validate_background(text: str) -> Dict[str, any]:
         "issues": issues,
         "warnings": warnings,
         "word_count": word_count,
-        "paragraph_count": len(paragraphs),
+        "paragraph_count": paragraph_count,
         "has_statistics": has_statistics,
         "has_existing_tech": has_existing_tech,
         "has_problems": has_problems,
@@ -180,37 +234,9 @@ def validate_background(text: str) -> Dict[str, any]:
     }
 
 
-def generate_background_locally(abstract: str, max_attempts: int = 3) -> Dict[str, any]:
-    """
-    Generate the 'Background of the Invention' section matching Indian Patent Office format.
-    
-    Real patent structure (IN202541069047):
-    - Paragraph 1: Problem statement with statistics
-    - Paragraph 2: More problem context with specific data
-    - Paragraphs 3-4: Existing technologies and their limitations
-    - Paragraph 5: General technical background (e.g., LPWAN definition)
-    - Paragraph 6: Bridge to prior art
-    - Paragraphs 7-11: Specific prior art citations with critique
-    - Paragraph 12: Statement of need
-    
-    Args:
-        abstract: The patent abstract text
-        max_attempts: Number of generation attempts if validation fails
-        
-    Returns:
-        Dictionary containing the generated background and metadata
-    """
-    
-    domain_info = extract_domain_statistics(abstract)
-    
-    # Build enhanced prompt based on real patent structure
-    prompt = f"""You are a patent attorney drafting the "Background of the Invention" section for an Indian Complete Specification patent application.
-
-INVENTION ABSTRACT:
-{abstract}
-
-DOMAIN: {domain_info.get('domain', 'technology')}
-TECHNOLOGIES: {', '.join(domain_info.get('technologies', []))}
+# Instructions and the worked example, identical for every abstract. Kept at the start of
+# the prompt so its KV state (~1500 tokens) is computed once and shared by all calls.
+BACKGROUND_PROMPT_PREFIX = """You are a patent attorney drafting the "Background of the Invention" section for an Indian Complete Specification patent application.
 
 REAL PATENT EXAMPLE STRUCTURE (Study this carefully):
 
@@ -247,31 +273,151 @@ STRICT REQUIREMENTS:
 9. Use passive voice and present/past tense
 10. Be objective, not promotional
 
+"""
+
+
+def warm_prompt_cache(llm=None):
+    """
+    Prefill BACKGROUND_PROMPT_PREFIX once so its KV state is in the prompt cache before
+    the first request. With PATENTDOC_PROMPT_CACHE_DIR set the state is kept on disk, so
+    this is a one-time cost that later cold starts skip.
+    """
+    if llm is None:
+        llm = get_fast_llm()
+    run_completion(llm, BACKGROUND_PROMPT_PREFIX, max_tokens=1)
+
+
+def generate_background_locally(abstract: str, max_attempts: int = 3, on_text=None,
+                                llm=None) -> Dict[str, any]:
+    """
+    Generate the 'Background of the Invention' section matching Indian Patent Office format.
+    
+    Real patent structure (IN202541069047):
+    - Paragraph 1: Problem statement with statistics
+    - Paragraph 2: More problem context with specific data
+    - Paragraphs 3-4: Existing technologies and their limitations
+    - Paragraph 5: General technical background (e.g., LPWAN definition)
+    - Paragraph 6: Bridge to prior art
+    - Paragraphs 7-11: Specific prior art citations with critique
+    - Paragraph 12: Statement of need
+    
+    Args:
+        abstract: The patent abstract text
+        max_attempts: Number of generation attempts if validation fails
+        on_text: Optional callback receiving the partial text while it streams
+        
+    Returns:
+        Dictionary containing the generated background and metadata
+    """
+    # Keyed by the model that will generate, so a caller-supplied llm gets its own entries.
+    # The default model is named by MODEL_VERSION, so a cache hit never has to load it.
+    model = MODEL_VERSION if llm is None else model_identity(llm)
+    cache_path = _cache_path(abstract, max_attempts, model)
+    if os.path.isfile(cache_path):
+        with open(cache_path, "r") as f:
+            result = json.load(f)
+        if on_text:
+            on_text(result["text"])
+        return result
+    
+    result = _generate_background(abstract, max_attempts, on_text, llm)
+    if result["text"]:
+        _write_cache(cache_path, result)
+    return result
+
+
+def _cache_path(abstract: str, max_attempts: int, model: str) -> str:
+    key = hashlib.blake2b(digest_size=16)
+    for part in (str(CACHE_VERSION), model, BACKGROUND_PROMPT_PREFIX, str(max_attempts), abstract):
+        key.update(part.encode("utf-8") + b"\0")
+    return os.path.join(CACHE_DIR, key.hexdigest() + ".json")
+
+
+def _write_cache(path: str, result: Dict):
+    # Write to a temporary file and rename, so concurrent readers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+
+def _generate_background(abstract: str, max_attempts: int, on_text, llm) -> Dict[str, any]:
+    """Uncached body of generate_background_locally."""
+    domain_info = extract_domain_statistics(abstract)
+    
+    # Only the abstract-specific tail differs between calls; the shared prefix is reused
+    # from llama.cpp's prompt cache instead of being prefilled again
+    prompt = BACKGROUND_PROMPT_PREFIX + f"""INVENTION ABSTRACT:
+{abstract}
+
+DOMAIN: {domain_info.get('domain', 'technology')}
+TECHNOLOGIES: {', '.join(domain_info.get('technologies', []))}
+
 NOW WRITE THE BACKGROUND OF THE INVENTION (only the text, no heading):
 
 The"""
 
-    best_result = None
-    best_score = float('inf')
+    if llm is None:
+        llm = get_fast_llm()
     
-    for attempt in range(max_attempts):
+    def is_good(result):
+        return result is not None and result["valid"] and len(result["warnings"]) <= 1
+    
+    def run_attempt(attempt: int, attempt_on_text=None):
+        """Generate, clean and validate one candidate; None if it was aborted or failed."""
         try:
-            response = llm(
-                prompt=prompt,
+            # Watch the stream: abort the attempt as soon as a prohibited phrase appears (it
+            # would fail validation anyway; the last attempt always finishes so there is a
+            # result), and stop once the need paragraph is complete.
+            stream_state = {"prohibited": None, "need": -1}
+            can_abort = attempt < max_attempts - 1
+        
+            def should_stop(text):
+                start = max(0, len(text) - _STREAM_WINDOW)
+                match = _RE_PROHIBITED_ANY_CASE.search(text, start) if can_abort else None
+                if match:
+                    stream_state["prohibited"] = match.group(0)
+                    return True
+                if stream_state["need"] < 0:
+                    stream_state["need"] = text.find(NEED_OPENING, max(0, start - len(NEED_OPENING)))
+                return stream_state["need"] >= 0 and text.find("\n\n", stream_state["need"]) >= 0
+        
+            text = run_completion(
+                llm, prompt, attempt_on_text, prefix="The", should_stop=should_stop,
                 max_tokens=2048,
                 temperature=0.3 if attempt == 0 else 0.35 + (attempt * 0.1),
                 stop=["OBJECTS OF THE INVENTION", "SUMMARY OF THE INVENTION", "\n\n\n\n\n"],
                 top_p=0.88,
                 repeat_penalty=1.15
             )
-            
-            raw_text = "The" + response["choices"][0]["text"].strip()
+        
+            if stream_state["prohibited"]:
+                return None  # Aborted mid-stream; the next attempt runs at a higher temperature
+        
+            raw_text = "The" + text.strip()
             cleaned_text = clean_background_text(raw_text)
             validation = validate_background(cleaned_text)
-            
+        
+            # A missing need statement is the only defect: continue the same text with the
+            # closing paragraph instead of regenerating everything. The prompt and the text
+            # are still in the KV cache, so only the continuation is decoded.
+            if validation["issues"] == [NEED_ISSUE]:
+                closing = run_completion(
+                    llm, prompt + text.rstrip() + "\n\n" + NEED_OPENING,
+                    max_tokens=160,
+                    temperature=0.3,
+                    stop=["\n\n"],
+                    top_p=0.88,
+                    repeat_penalty=1.15
+                )
+                raw_text += "\n\n" + NEED_OPENING + closing.rstrip()
+                cleaned_text = clean_background_text(raw_text)
+                validation = validate_background(cleaned_text)
+        
             # Calculate quality score (lower is better)
             score = len(validation["issues"]) * 15 + len(validation["warnings"]) * 3
-            
+        
             result = {
                 "text": cleaned_text,
                 "valid": validation["valid"],
@@ -288,17 +434,28 @@ The"""
                 "domain_info": domain_info,
                 "score": score
             }
-            
-            if validation["valid"] and len(validation["warnings"]) <= 1:
-                return result
-            
-            # Track best attempt
-            if score < best_score:
-                best_score = score
-                best_result = result
-                
-        except Exception as e:
-            continue
+            return result
+    
+        except Exception:
+            return None
+    
+    if isinstance(llm, LlamaServerClient) and max_attempts > 1:
+        # llama-server decodes concurrent requests in one batch, so all attempts run together
+        # for about the wall time of one; only the first one streams to the UI
+        with ThreadPoolExecutor(max_workers=max_attempts) as executor:
+            results = list(executor.map(run_attempt, range(max_attempts), [on_text] + [None] * (max_attempts - 1)))
+    else:
+        # One in-process context decodes one sequence at a time: stop at the first good attempt
+        results = []
+        for attempt in range(max_attempts):
+            results.append(run_attempt(attempt, on_text))
+            if is_good(results[-1]):
+                break
+    
+    candidates = [result for result in results if result is not None]
+    best_result = next((result for result in candidates if is_good(result)), None)
+    if best_result is None and candidates:
+        best_result = min(candidates, key=lambda result: result["score"])
     
     return best_result if best_result else {
         "text": "",
@@ -318,107 +475,100 @@ def format_for_patent_document(background_text: str, include_heading: bool = Tru
     Format the background text with Indian Patent Office standard formatting.
     Includes optional line numbering (every 5 lines) on right margin.
     """
-    output = ""
+    lines = ["BACKGROUND OF THE INVENTION", ""] if include_heading else []
     
-    if include_heading:
-        output += "BACKGROUND OF THE INVENTION\n\n"
+    if not add_line_numbers:
+        lines.append(background_text)
+        return '\n'.join(lines)
     
-    if add_line_numbers:
-        # Add line numbers every 5 lines (like in real patent)
-        lines = []
-        line_counter = 1
-        
-        for para in background_text.split('\n\n'):
-            para_lines = para.split('. ')
-            for i, sent in enumerate(para_lines):
-                if sent.strip():
-                    if i < len(para_lines) - 1:
-                        sent += '.'
-                    
-                    # Wrap at ~75 characters
-                    wrapped = [sent[i:i+75] for i in range(0, len(sent), 75)]
-                    
-                    for wrap_line in wrapped:
-                        line_text = wrap_line
-                        
-                        # Add line number every 5 lines
-                        if line_counter % 5 == 0:
-                            line_text += f"{line_counter:>80}"
-                        
-                        lines.append(line_text)
-                        line_counter += 1
-            
-            lines.append("")  # Blank line between paragraphs
-            line_counter += 1
+    # Add line numbers every 5 lines (like in real patent)
+    line_counter = 1
+    
+    for para in background_text.split('\n\n'):
+        para_lines = para.split('. ')
+        for i, sent in enumerate(para_lines):
+            if sent.strip():
+                if i < len(para_lines) - 1:
+                    sent += '.'
+                
+                # Wrap at ~75 characters on word boundaries
+                for wrap_line in textwrap.wrap(sent, width=75, break_long_words=False):
+                    if line_counter % 5 == 0:
+                        wrap_line += str(line_counter).rjust(80)
+                    lines.append(wrap_line)
+                    line_counter += 1
         
-        output += '\n'.join(lines)
-    else:
-        output += background_text
+        lines.append("")  # Blank line between paragraphs
+        line_counter += 1
     
-    return output
+    return '\n'.join(lines)
 
 
 def print_formatted_report(result: Dict):
-    """Print a professional validation report."""
-    print("\n" + "=" * 85)
-    print("           BACKGROUND OF THE INVENTION - VALIDATION REPORT")
-    print("=" * 85)
+    """Print a professional validation report (built first, then written in one call)."""
+    out = []
+    
+    out.append("\n" + "=" * 85)
+    out.append("           BACKGROUND OF THE INVENTION - VALIDATION REPORT")
+    out.append("=" * 85)
     
     # Status
     if result["valid"] and len(result["warnings"]) == 0:
-        print("\n✅ STATUS: EXCELLENT - Meets Indian Patent Office standards")
+        out.append("\n✅ STATUS: EXCELLENT - Meets Indian Patent Office standards")
     elif result["valid"]:
-        print("\n✅ STATUS: VALID - Minor improvements recommended")
+        out.append("\n✅ STATUS: VALID - Minor improvements recommended")
     else:
-        print("\n❌ STATUS: NEEDS REVISION - Critical issues found")
+        out.append("\n❌ STATUS: NEEDS REVISION - Critical issues found")
     
     # Metrics
-    print("\n" + "-" * 85)
-    print("📊 METRICS:")
-    print(f"   Word Count:         {result['word_count']} words (optimal: 400-800)")
-    print(f"   Paragraph Count:    {result['paragraph_count']} paragraphs (optimal: 5-12)")
-    print(f"   Generation Attempt: {result['attempt']}")
-    print(f"   Quality Score:      {result['score']} (lower is better)")
+    out.append("\n" + "-" * 85)
+    out.append("📊 METRICS:")
+    out.append(f"   Word Count:         {result['word_count']} words (optimal: 400-800)")
+    out.append(f"   Paragraph Count:    {result['paragraph_count']} paragraphs (optimal: 5-12)")
+    out.append(f"   Generation Attempt: {result['attempt']}")
+    out.append(f"   Quality Score:      {result['score']} (lower is better)")
     
     # Content checks
-    print("\n" + "-" * 85)
-    print("📋 CONTENT VERIFICATION:")
-    print(f"   Statistics/Data:       {'✓' if result['has_statistics'] else '✗'}")
-    print(f"   Existing Technology:   {'✓' if result['has_existing_tech'] else '✗'}")
-    print(f"   Problems/Limitations:  {'✓' if result['has_problems'] else '✗'}")
-    print(f"   Prior Art Citations:   {'✓' if result['has_prior_art_citations'] else '✗'}")
-    print(f"   Statement of Need:     {'✓' if result['has_need'] else '✗'}")
+    out.append("\n" + "-" * 85)
+    out.append("📋 CONTENT VERIFICATION:")
+    out.append(f"   Statistics/Data:       {'✓' if result['has_statistics'] else '✗'}")
+    out.append(f"   Existing Technology:   {'✓' if result['has_existing_tech'] else '✗'}")
+    out.append(f"   Problems/Limitations:  {'✓' if result['has_problems'] else '✗'}")
+    out.append(f"   Prior Art Citations:   {'✓' if result['has_prior_art_citations'] else '✗'}")
+    out.append(f"   Statement of Need:     {'✓' if result['has_need'] else '✗'}")
     
     # Domain info
     if result.get('domain_info'):
         info = result['domain_info']
-        print("\n" + "-" * 85)
-        print("🔍 DETECTED DOMAIN:")
+        out.append("\n" + "-" * 85)
+        out.append("🔍 DETECTED DOMAIN:")
         if info.get('domain'):
-            print(f"   Domain:        {info['domain']}")
+            out.append(f"   Domain:        {info['domain']}")
         if info.get('technologies'):
-            print(f"   Technologies:  {', '.join(info['technologies'][:8])}")
+            out.append(f"   Technologies:  {', '.join(info['technologies'][:8])}")
     
     # Issues
     if result["issues"]:
-        print("\n" + "-" * 85)
-        print("🚨 CRITICAL ISSUES:")
+        out.append("\n" + "-" * 85)
+        out.append("🚨 CRITICAL ISSUES:")
         for i, issue in enumerate(result["issues"], 1):
-            print(f"   {i}. {issue}")
+            out.append(f"   {i}. {issue}")
     
     # Warnings
     if result["warnings"]:
-        print("\n" + "-" * 85)
-        print("⚠️  WARNINGS:")
+        out.append("\n" + "-" * 85)
+        out.append("⚠️  WARNINGS:")
         for i, warning in enumerate(result["warnings"], 1):
-            print(f"   {i}. {warning}")
+            out.append(f"   {i}. {warning}")
     
     # The background text
-    print("\n" + "=" * 85)
-    print("📝 GENERATED BACKGROUND OF THE INVENTION:")
-    print("-" * 85)
-    print(result["text"])
-    print("-" * 85)
+    out.append("\n" + "=" * 85)
+    out.append("📝 GENERATED BACKGROUND OF THE INVENTION:")
+    out.append("-" * 85)
+    out.append(result["text"])
+    out.append("-" * 85)
+    
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 # CLI for testing locally
@@ -445,7 +595,8 @@ if __name__ == "__main__":
     
     print("\n⏳ Generating 'Background of the Invention' (analyzing abstract and generating up to 3 versions)...")
     
-    result = generate_background_locally(abstract, max_attempts=3)
+    result = generate_background_locally(abstract, max_attempts=3, on_text=terminal_stream())
+    print()
     
     if not result["text"]:
         print("\n❌ ERROR:")
@@ -470,17 +621,19 @@ if __name__ == "__main__":
         print("=" * 85)
         print(format_for_patent_document(result["text"], include_heading=True, add_line_numbers=True))
     
-    print("\n" + "=" * 85)
-    print("💡 TIPS FOR PERFECT BACKGROUND OF INVENTION:")
-    print("=" * 85)
-    print("1. Start with problem statement + specific statistics (e.g., '35% increase')")
-    print("2. Describe existing technologies objectively (what they are, how they work)")
-    print("3. Identify limitations and challenges with current solutions")
-    print("4. Optional: Cite specific prior art (CN123456A, IN202012345, etc.)")
-    print("5. Critique prior art briefly but objectively")
-    print("6. End with: 'Accordingly, there exists a need for...'")
-    print("7. NEVER describe your own invention in Background")
-    print("8. Use third person, present/past tense, passive voice")
-    print("9. Include quantitative data where possible (numbers, percentages)")
-    print("10. Aim for 400-800 words, 5-12 paragraphs")
-    print("=" * 85)
+    sys.stdout.write("\n".join([
+        "\n" + "=" * 85,
+        "💡 TIPS FOR PERFECT BACKGROUND OF INVENTION:",
+        "=" * 85,
+        "1. Start with problem statement + specific statistics (e.g., '35% increase')",
+        "2. Describe existing technologies objectively (what they are, how they work)",
+        "3. Identify limitations and challenges with current solutions",
+        "4. Optional: Cite specific prior art (CN123456A, IN202012345, etc.)",
+        "5. Critique prior art briefly but objectively",
+        "6. End with: 'Accordingly, there exists a need for...'",
+        "7. NEVER describe your own invention in Background",
+        "8. Use third person, present/past tense, passive voice",
+        "9. Include quantitative data where possible (numbers, percentages)",
+        "10. Aim for 400-800 words, 5-12 paragraphs",
+        "=" * 85,
+    ]) + "\n")
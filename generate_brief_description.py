@@ -1,21 +1,41 @@
-from llama_cpp import Llama
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List
 
+from llm_loader import LlamaServerClient, get_fast_llm, run_completion, terminal_stream
 
-# Path to your locally downloaded Phi-3 model (.gguf file)
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
 
+# Compiled once at import instead of going through re's pattern cache on every call.
+# The keyword alternations are plain substring matches, like the `in` checks they replace.
+_RE_SYSTEM_WORDS = re.compile(r'system|block diagram|setup|apparatus|device')
+# Every abstract signal in one scan: method and data keywords, and the component list after
+# "comprising" / "includes" / "consists of". The lookahead tries each position, so matches
+# may overlap (a keyword inside a component list still counts); no two alternatives can
+# match at the same position.
+_RE_ABSTRACT_SIGNALS = re.compile(
+    r'(?=(?P<method>method|process|steps|algorithm)'
+    r'|(?P<data>comparative|results|latency|accuracy|performance)'
+    r'|comprising[:\s]+(?P<comprising>[^\.]{20,150})'
+    r'|includes?\s+(?P<includes>[^\.]{20,100})'
+    r'|consists of\s+(?P<consists>[^\.]{20,100}))',
+    re.IGNORECASE
+)
+_COMPONENT_GROUPS = ('comprising', 'includes', 'consists')
+_RE_LIST_SEPARATOR = re.compile(r'[,;]\s*')
 
+_RE_HEADER = re.compile(r'^(BRIEF DESCRIPTION OF THE DRAWINGS:?)\s*', re.IGNORECASE | re.MULTILINE)
+# **bold**, __underline__ and *italic*, unwrapped in that order: each pass sees what the
+# previous one left, so stray or overlapping markers resolve exactly as they always have
+_RE_BOLD = re.compile(r'\*\*([^*]+)\*\*')
+_RE_UNDERLINE = re.compile(r'__([^_]+)__')
+_RE_ITALIC = re.compile(r'\*([^*]+)\*')
+# "figure 2", "Figure2:" or "FIG. 2" opening a line (never reaching into the next line)
+_RE_FIGURE_PREFIX = re.compile(r'^(?:[Ff]igure|FIG\.?)[^\S\n]*(\d+[A-Z]?)(?:[^\S\n]|:)*', re.MULTILINE)
+_RE_MISSING_PERIOD = re.compile(r'(?<!\.)$', re.MULTILINE)
 
-# Load the model ONCE at module level
-llm = Llama(
-    model_path=LLM_PATH, device="auto",
-    n_ctx=4096,
-    n_threads=4,
-    n_batch=512,
-    verbose=False
-)
+_RE_FIGURE_NUMBER = re.compile(r'Figure\s+(\d+)')
+_RE_FIGURE_LINE = re.compile(r'Figure\s+\d+[A-Z]?:\s+')
+_RE_FIGURE_LINE_START = re.compile(r'\s*(?:figure|fig\.?)\s*\d', re.IGNORECASE)
 
 
 def extract_figure_info_from_abstract(abstract: str) -> Dict[str, any]:
@@ -31,26 +51,21 @@ def extract_figure_info_from_abstract(abstract: str) -> Dict[str, any]:
         'suggested_count': 5
     }
     
-    abstract_lower = abstract.lower()
-    
-    # Check for method/process
-    info['has_method'] = any(word in abstract_lower for word in ['method', 'process', 'steps', 'algorithm'])
-    
-    # Check for data/results
-    info['has_data'] = any(word in abstract_lower for word in ['comparative', 'results', 'latency', 'accuracy', 'performance'])
-    
-    # Extract main system components
-    component_patterns = [
-        r'comprising[:\s]+([^\.]{20,150})',
-        r'includes?\s+([^\.]{20,100})',
-        r'consists of\s+([^\.]{20,100})'
-    ]
-    
-    for pattern in component_patterns:
-        matches = re.findall(pattern, abstract, re.IGNORECASE)
-        if matches:
+    # First component list after each introducing word, in _COMPONENT_GROUPS order
+    components = {}
+    for match in _RE_ABSTRACT_SIGNALS.finditer(abstract):
+        group = match.lastgroup
+        if group == 'method':
+            info['has_method'] = True
+        elif group == 'data':
+            info['has_data'] = True
+        else:
+            components.setdefault(group, match.group(group))
+    
+    for group in _COMPONENT_GROUPS:
+        if group in components:
             # Split by commas and semicolons
-            parts = re.split(r'[,;]\s*', matches[0])
+            parts = _RE_LIST_SEPARATOR.split(components[group])
             info['system_components'].extend([p.strip() for p in parts[:5]])
     
     # Estimate figure count
@@ -70,31 +85,20 @@ def extract_figure_info_from_abstract(abstract: str) -> Dict[str, any]:
 def clean_brief_description(text: str) -> str:
     """Clean and format the brief description text."""
     # Remove header if added
-    text = re.sub(r'^(BRIEF DESCRIPTION OF THE DRAWINGS:?)\s*', '', text, flags=re.IGNORECASE | re.MULTILINE)
+    text = _RE_HEADER.sub('', text)
     
     # Remove markdown/formatting
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    text = re.sub(r'__([^_]+)__', r'\1', text)
-    text = re.sub(r'\*([^*]+)\*', r'\1', text)
-    
-    # Standardize figure format
-    lines = []
-    for line in text.split('\n'):
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Ensure "Figure X:" format (capital F, colon)
-        line = re.sub(r'^[Ff]igure\s*(\d+[A-Z]?)[\s:]*', r'Figure \1: ', line)
-        line = re.sub(r'^FIG\.?\s*(\d+[A-Z]?)[\s:]*', r'Figure \1: ', line)
-        
-        # Ensure ends with period
-        if line and not line.endswith('.'):
-            line += '.'
-        
-        lines.append(line)
+    for pattern in (_RE_BOLD, _RE_UNDERLINE, _RE_ITALIC):
+        text = pattern.sub(r'\1', text)
+    
+    # One figure per line, without blank lines
+    text = '\n'.join(line for line in map(str.strip, text.split('\n')) if line)
+    if not text:
+        return text
     
-    return '\n'.join(lines)
+    # Ensure "Figure X:" format (capital F, colon) and that every line ends with a period
+    text = _RE_FIGURE_PREFIX.sub(r'Figure \1: ', text)
+    return _RE_MISSING_PERIOD.sub('.', text)
 
 
 def validate_brief_description(text: str, expected_count: int = None) -> Dict[str, any]:
@@ -108,8 +112,7 @@ def validate_brief_description(text: str, expected_count: int = None) -> Dict[st
     text_lower = text.lower()
     
     # Extract figure numbers
-    figure_matches = re.findall(r'Figure\s+(\d+[A-Z]?)', text)
-    figure_numbers = [int(re.match(r'(\d+)', f).group(1)) for f in figure_matches]
+    figure_numbers = [int(n) for n in _RE_FIGURE_NUMBER.findall(text)]
     
     if not figure_numbers:
         issues.append("No figures found. Must have at least 3-5 figures.")
@@ -136,7 +139,7 @@ def validate_brief_description(text: str, expected_count: int = None) -> Dict[st
         fig_num = i + 1
         
         # Must start with "Figure X:"
-        if not re.match(r'^Figure\s+\d+[A-Z]?:\s+', line):
+        if not _RE_FIGURE_LINE.match(line):
             issues.append(f"Line {i+1}: Must start with 'Figure X: '")
         
         # Must contain "illustrates" (Indian Patent Office standard)
@@ -148,8 +151,9 @@ def validate_brief_description(text: str, expected_count: int = None) -> Dict[st
             issues.append(f"Figure {fig_num}: Must end with period")
         
         # Check for "according to the present invention" for system figures
-        if any(word in line.lower() for word in ['system', 'block diagram', 'setup', 'apparatus', 'device']):
-            if 'according to the present invention' not in line.lower():
+        line_lower = line.lower()
+        if _RE_SYSTEM_WORDS.search(line_lower):
+            if 'according to the present invention' not in line_lower:
                 warnings.append(f"Figure {fig_num}: System figures should end with 'according to the present invention'")
     
     return {
@@ -160,27 +164,9 @@ def validate_brief_description(text: str, expected_count: int = None) -> Dict[st
     }
 
 
-def generate_brief_description(abstract: str, num_figures: int = None, 
-                               figure_descriptions: str = "", max_attempts: int = 3) -> Dict[str, any]:
-    """
-    Generate 'Brief Description of the Drawings' section matching Indian Patent Office format.
-    """
-    
-    # Extract information from abstract
-    fig_info = extract_figure_info_from_abstract(abstract)
-    
-    if num_figures is None:
-        num_figures = fig_info['suggested_count']
-    
-    # Build prompt based on real patent format
-    prompt = f"""You are a patent attorney drafting "Brief Description of the Drawings" for an Indian patent.
-
-INVENTION ABSTRACT:
-{abstract}
-
-{f"USER INFO: {figure_descriptions}" if figure_descriptions else ""}
-
-NUMBER OF FIGURES: {num_figures}
+# Static part of the prompt (instructions and example). It comes first so consecutive
+# calls share it as a prompt prefix; the abstract and figure count follow it.
+BRIEF_PROMPT_PREFIX = """You are a patent attorney drafting "Brief Description of the Drawings" for an Indian patent.
 
 REAL PATENT EXAMPLE:
 
@@ -196,19 +182,61 @@ RULES:
 3. Data figures: NO "according to..." - just describe
 4. Types: block diagram, setup, flowchart, comparative, detailed view
 5. One line per figure, ends with period
-6. Write EXACTLY {num_figures} figures
+6. Write EXACTLY the number of figures given below
+
+"""
+
+
+def generate_brief_description(abstract: str, num_figures: int = None, 
+                               figure_descriptions: str = "", max_attempts: int = 3,
+                               on_text=None, llm=None) -> Dict[str, any]:
+    """
+    Generate 'Brief Description of the Drawings' section matching Indian Patent Office format.
+    """
+    
+    # Extract information from abstract
+    fig_info = extract_figure_info_from_abstract(abstract)
+    
+    if num_figures is None:
+        num_figures = fig_info['suggested_count']
+    
+    # Only the abstract-specific tail differs between calls; the shared prefix is reused
+    # from llama.cpp's prompt cache instead of being prefilled again
+    prompt = BRIEF_PROMPT_PREFIX + f"""INVENTION ABSTRACT:
+{abstract}
+
+{f"USER INFO: {figure_descriptions}" if figure_descriptions else ""}
+
+NUMBER OF FIGURES: {num_figures} (write exactly {num_figures} figures)
 
 NOW WRITE (only text, no heading):
 
 Figure 1:"""
 
-    best_result = None
-    best_score = float('inf')
+    if llm is None:
+        llm = get_fast_llm()
+    
+    def is_good(result):
+        return result is not None and result["valid"] and len(result["warnings"]) <= 1
     
-    for attempt in range(max_attempts):
+    def run_attempt(attempt: int, attempt_on_text=None):
+        # Stop decoding once the requested number of figure lines is complete, instead of
+        # running to max_tokens. Figure 1's line starts in the prompt; later ones must
+        # open with "Figure N" / "FIG. N".
+        lines = {"done": 0, "start": 0}
+        
+        def should_stop(text):
+            end = text.find("\n", lines["start"])
+            while end >= 0:
+                if lines["start"] == 0 or _RE_FIGURE_LINE_START.match(text, lines["start"], end):
+                    lines["done"] += 1
+                lines["start"] = end + 1
+                end = text.find("\n", lines["start"])
+            return lines["done"] >= num_figures
+        
         try:
-            response = llm(
-                prompt=prompt,
+            text = run_completion(
+                llm, prompt, attempt_on_text, prefix="Figure 1:", should_stop=should_stop,
                 max_tokens=600,
                 temperature=0.2 if attempt == 0 else 0.25 + (attempt * 0.1),
                 stop=["DETAILED DESCRIPTION", "\n\n\n\n"],
@@ -216,13 +244,13 @@ Figure 1:"""
                 repeat_penalty=1.2
             )
             
-            raw_text = "Figure 1:" + response["choices"][0]["text"].strip()
+            raw_text = "Figure 1:" + text.strip()
             cleaned_text = clean_brief_description(raw_text)
             validation = validate_brief_description(cleaned_text, num_figures)
             
             score = len(validation["issues"]) * 20 + len(validation["warnings"]) * 5
             
-            result = {
+            return {
                 "text": cleaned_text,
                 "valid": validation["valid"],
                 "issues": validation["issues"],
@@ -232,16 +260,24 @@ Figure 1:"""
                 "attempt": attempt + 1,
                 "score": score
             }
-            
-            if validation["valid"] and len(validation["warnings"]) <= 1:
-                return result
-            
-            if score < best_score:
-                best_score = score
-                best_result = result
-                
-        except Exception as e:
-            continue
+        except Exception:
+            return None
+    
+    if isinstance(llm, LlamaServerClient) and max_attempts > 1:
+        # Attempts share one batched decode on llama-server; only the first streams to the UI
+        with ThreadPoolExecutor(max_workers=max_attempts) as executor:
+            results = list(executor.map(run_attempt, range(max_attempts), [on_text] + [None] * (max_attempts - 1)))
+    else:
+        results = []
+        for attempt in range(max_attempts):
+            results.append(run_attempt(attempt, on_text))
+            if is_good(results[-1]):
+                break
+    
+    candidates = [result for result in results if result is not None]
+    best_result = next((result for result in candidates if is_good(result)), None)
+    if best_result is None and candidates:
+        best_result = min(candidates, key=lambda result: result["score"])
     
     return best_result if best_result else {
         "text": "",
@@ -255,12 +291,13 @@ Figure 1:"""
 
 
 # BACKWARD COMPATIBILITY WRAPPER
-def generate_drawing_descriptions(abstract: str, num_figures: int = None, max_attempts: int = 2) -> Dict[str, any]:
+def generate_drawing_descriptions(abstract: str, num_figures: int = None, max_attempts: int = 2,
+                                  on_text=None, llm=None) -> Dict[str, any]:
     """
     Backward compatibility wrapper for existing app.py.
     Calls generate_brief_description internally.
     """
-    return generate_brief_description(abstract, num_figures, "", max_attempts)
+    return generate_brief_description(abstract, num_figures, "", max_attempts, on_text=on_text, llm=llm)
 
 
 def format_for_patent_document(brief_desc_text: str, include_heading: bool = True) -> str:
@@ -288,7 +325,8 @@ if __name__ == "__main__":
     
     print("\n⏳ Generating...")
     
-    result = generate_brief_description(abstract, num_figures)
+    result = generate_brief_description(abstract, num_figures, on_text=terminal_stream())
+    print()
     
     if not result["text"]:
         print("\n❌ ERROR:")
@@ -1,21 +1,28 @@
 import os
 import faiss
 import json
+import mmap
 import numpy as np
-from llama_cpp import Llama
-from sentence_transformers import SentenceTransformer
 import re
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional
+from functools import lru_cache, partial
+from itertools import islice
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Optional
+
+from llm_loader import LlamaServerClient, get_llm, run_completion
+from embeddings import get_embedder
 
 
 # === Configuration ===
 class PatentConfig:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    LLM_PATH = os.path.join(BASE_DIR, "models", "models", "phi-3-mini-4k-instruct-q4.gguf")
     INDEX_PATH = os.path.join(BASE_DIR, "data", "bigpatent_tiny", "faiss.index")
     METADATA_PATH = os.path.join(BASE_DIR, "data", "bigpatent_tiny", "faiss_metadata.json")
+    METADATA_OFFSETS_PATH = os.path.join(BASE_DIR, "data", "bigpatent_tiny", "faiss_metadata.offsets.npy")
+    IVF_NPROBE = 8  # Inverted lists scanned per prior-art query
+    HNSW_EF_SEARCH = 64  # Candidate list size per prior-art query on HNSW indexes
     
     # Generation parameters
     TEMPERATURE = 0.15
@@ -26,49 +33,143 @@ class PatentConfig:
     MAX_TOKENS_METHOD = 768
 
 
-# === Load models ONCE (singleton pattern) ===
+# === Load models lazily, ONCE per process ===
+@lru_cache(maxsize=1)
+def get_faiss_index():
+    """Read the prior-art index on first use, with its per-query search breadth set."""
+    index = faiss.read_index(PatentConfig.INDEX_PATH)
+    if hasattr(index, "nprobe"):  # IVF-PQ index (large corpora)
+        index.nprobe = PatentConfig.IVF_NPROBE
+    elif hasattr(index, "hnsw"):  # HNSW index (mid-sized corpora)
+        index.hnsw.efSearch = PatentConfig.HNSW_EF_SEARCH
+    return index
+
+
+class MetadataStore:
+    """
+    Read-only, list-like view of faiss_metadata.json. The file is memory-mapped and an entry
+    is parsed only when it is looked up, using the byte offsets written by build_faiss_index.py,
+    so startup does not depend on corpus size and worker processes share the page cache.
+    """
+    
+    _decoder = json.JSONDecoder()
+    
+    def __init__(self, path: str, offsets_path: str):
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        with open(path, "rb") as f:
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, idx: int) -> Dict:
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        # The slice may end with the separator before the next entry; raw_decode stops at the object
+        return self._decoder.raw_decode(self._blob[start:end].decode("utf-8"))[0]
+
+
+@lru_cache(maxsize=1)
+def get_metadata() -> Sequence[Dict]:
+    """Open the abstract/background entries that parallel the FAISS index, on first use."""
+    offsets_path = PatentConfig.METADATA_OFFSETS_PATH
+    # Indexes built before the offsets file existed (or with a hand-edited JSON) are loaded whole
+    if (os.path.exists(offsets_path)
+            and os.path.getmtime(offsets_path) >= os.path.getmtime(PatentConfig.METADATA_PATH)):
+        return MetadataStore(PatentConfig.METADATA_PATH, offsets_path)
+    with open(PatentConfig.METADATA_PATH, "r") as f:
+        return json.load(f)
+
+
 class ModelManager:
+    """
+    Singleton view of the shared models. Nothing is loaded until an attribute is first read,
+    so importing this module or building the pipeline stays cheap (e.g. when every prior-art
+    query is already memoized, the embedder and FAISS index are never loaded).
+    """
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.llm = Llama(
-                model_path=PatentConfig.LLM_PATH, 
-                n_gpu_layers=-1,  # Use GPU if available
-                n_ctx=8192, 
-                n_threads=4,
-                verbose=False
-            )
-            cls._instance.embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
-            cls._instance.index = faiss.read_index(PatentConfig.INDEX_PATH)
-            with open(PatentConfig.METADATA_PATH, "r") as f:
-                cls._instance.metadata = json.load(f)
         return cls._instance
 
+    @property
+    def llm(self):
+        return get_llm()  # Shared with the other section generators
+
+    @property
+    def embedding_model(self):
+        return get_embedder()  # Shared with the semantic cache
+
+    @property
+    def index(self):
+        return get_faiss_index()
+
+    @property
+    def metadata(self) -> Sequence[Dict]:
+        return get_metadata()
+
+
+@lru_cache(maxsize=512)
+def _search_prior_art(query: str, top_k: int) -> Tuple[bool, Tuple[float, ...], Tuple[int, ...]]:
+    """
+    Embed the query and search the FAISS index, memoized for repeat abstracts (retries, re-runs).
+    Returns (whether scores are cosine similarities, scores, ids).
+    """
+    mm = ModelManager()
+    # Cosine (inner-product) indexes store normalized vectors; older L2 indexes don't
+    cosine = mm.index.metric_type == faiss.METRIC_INNER_PRODUCT
+    query_embedding = mm.embedding_model.encode(
+        [query],
+        convert_to_numpy=True,
+        normalize_embeddings=cosine,
+        show_progress_bar=False  # One sentence: skip the tqdm bar setup per query
+    )
+    # FAISS copies anything that is not a C-contiguous float32 (1, d) array; this is a no-op otherwise
+    query_embedding = np.ascontiguousarray(query_embedding, dtype=np.float32)
+    scores, indices = mm.index.search(query_embedding, top_k)
+    return cosine, tuple(scores[0].tolist()), tuple(indices[0].tolist())
+
 
 # === Component Extraction (Enhanced) ===
 class ComponentExtractor:
     """Extract structured components from patent abstract using multiple strategies"""
     
-    COMPONENT_PATTERNS = [
+    # All patterns are compiled once, case-insensitive, when the class is defined
+    COMPONENT_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
         r'\b(\w+\s+(?:module|unit|sensor|system|node|server|interface|device|structure|'
         r'controller|processor|engine|detector|emitter|absorber|condenser|line|tube|'
-        r'pipe|valve|circuit|mechanism|assembly|apparatus|means|element|component))\b'
-    ]
+        r'pipe|valve|circuit|mechanism|assembly|apparatus|means|element|component))\b',
+    )]
     
-    DEVICE_PATTERNS = [
+    DEVICE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
         r'(?:A|An|The)\s+([^,]{15,80}?)\s+(?:comprising|including|having|for|that|which)',
         r'(?:present invention relates to|invention provides|disclosed is)\s+(?:a|an)\s+([^,]{15,80}?)(?:\s+comprising|\s+for|\s+that)',
         r'(?:system|apparatus|device|method)\s+for\s+([^,]{15,80}?)(?:\s+comprising|\s+including)',
-    ]
+    )]
     
-    PURPOSE_PATTERNS = [
+    PURPOSE_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
         r'(?:system|device|apparatus|method)\s+for\s+([^,\.]{15,100})',
         r'configured to\s+([^,\.]{15,80})',
         r'adapted to\s+([^,\.]{15,80})',
         r'operable to\s+([^,\.]{15,80})',
-    ]
+    )]
+    
+    COMPRISING_PATTERN = re.compile(r'(?:comprising|including|having)\s+([^\.]+?)(?:\.|;|and wherein)',
+                                    re.IGNORECASE)
+    ELEMENT_SEPARATOR = re.compile(r',\s*(?:and\s+)?|\s+and\s+')
+    FUNCTION_PATTERN = re.compile(r'(?:configured|operable|adapted|designed|arranged)\s+to\s+([^,\.]{10,80})',
+                                  re.IGNORECASE)
+    
+    EFFECT_KEYWORDS = ['reducing', 'increasing', 'improving', 'enhancing',
+                       'minimizing', 'maximizing', 'optimizing', 'enabling']
+    # One pattern per keyword: effects are listed keyword by keyword, as before
+    EFFECT_PATTERNS = [re.compile(rf'{keyword}\s+([^,\.]+)', re.IGNORECASE) for keyword in EFFECT_KEYWORDS]
+    
+    NOVELTY_KEYWORDS = ['novel', 'new', 'improved', 'innovative', 'unique',
+                        'first', 'unlike', 'superior', 'advantageous']
+    # Whole words only, so one scan finds every keyword present
+    NOVELTY_PATTERN = re.compile(r'\b(?:' + '|'.join(NOVELTY_KEYWORDS) + r')\b', re.IGNORECASE)
     
     @classmethod
     def extract(cls, abstract: str) -> Dict[str, any]:
@@ -87,7 +188,7 @@ class ComponentExtractor:
         
         # Extract device name with confidence
         for pattern in cls.DEVICE_PATTERNS:
-            match = re.search(pattern, abstract, re.IGNORECASE)
+            match = pattern.search(abstract)
             if match:
                 device_name = match.group(1).strip()
                 confidence = len(device_name) / 80.0
@@ -97,7 +198,7 @@ class ComponentExtractor:
         
         # Extract purpose
         for pattern in cls.PURPOSE_PATTERNS:
-            match = re.search(pattern, abstract, re.IGNORECASE)
+            match = pattern.search(abstract)
             if match:
                 purpose = match.group(1).strip()
                 if len(purpose) > len(components['purpose']):
@@ -105,53 +206,38 @@ class ComponentExtractor:
                     components['purpose_confidence'] = min(1.0, len(purpose) / 80.0)
         
         # Extract components from "comprising" clauses
-        comprising_matches = re.finditer(
-            r'(?:comprising|including|having)\s+([^\.]+?)(?:\.|;|and wherein)',
-            abstract,
-            re.IGNORECASE
-        )
-        
         seen_elements = set()
-        for match in comprising_matches:
+        for match in cls.COMPRISING_PATTERN.finditer(abstract):
             comprising_text = match.group(1)
-            parts = re.split(r',\s*(?:and\s+)?|\s+and\s+', comprising_text)
+            parts = cls.ELEMENT_SEPARATOR.split(comprising_text)
             for part in parts:
                 part = part.strip()
-                if len(part) > 10 and part.lower() not in seen_elements:
+                key = part.lower()
+                if len(part) > 10 and key not in seen_elements:
                     components['key_elements'].append(part)
-                    seen_elements.add(part.lower())
+                    seen_elements.add(key)
         
-        # Extract component keywords
+        # Extract component keywords (each match stripped and lowercased once)
         for pattern in cls.COMPONENT_PATTERNS:
-            matches = re.findall(pattern, abstract, re.IGNORECASE)
-            for comp in matches:
-                comp_clean = comp.strip().lower()
-                if comp_clean not in seen_elements and len(comp_clean) > 5:
-                    components['key_elements'].append(comp.strip())
-                    seen_elements.add(comp_clean)
+            for comp in pattern.findall(abstract):
+                comp = comp.strip()
+                key = comp.lower()
+                if len(key) > 5 and key not in seen_elements:
+                    components['key_elements'].append(comp)
+                    seen_elements.add(key)
         
         # Extract functions
-        function_matches = re.findall(
-            r'(?:configured|operable|adapted|designed|arranged)\s+to\s+([^,\.]{10,80})',
-            abstract,
-            re.IGNORECASE
-        )
+        function_matches = cls.FUNCTION_PATTERN.findall(abstract)
         components['functions'] = [f.strip() for f in function_matches]
         
         # Extract technical effects
-        effect_keywords = ['reducing', 'increasing', 'improving', 'enhancing', 
-                          'minimizing', 'maximizing', 'optimizing', 'enabling']
-        for keyword in effect_keywords:
-            pattern = rf'{keyword}\s+([^,\.]+)'
-            matches = re.findall(pattern, abstract, re.IGNORECASE)
+        for pattern in cls.EFFECT_PATTERNS:
+            matches = pattern.findall(abstract)
             components['technical_effects'].extend([m.strip() for m in matches])
         
         # Extract novelty indicators
-        novelty_keywords = ['novel', 'new', 'improved', 'innovative', 'unique', 
-                           'first', 'unlike', 'superior', 'advantageous']
-        for keyword in novelty_keywords:
-            if re.search(rf'\b{keyword}\b', abstract, re.IGNORECASE):
-                components['novelty_indicators'].append(keyword)
+        found = {word.lower() for word in cls.NOVELTY_PATTERN.findall(abstract)}
+        components['novelty_indicators'] = [keyword for keyword in cls.NOVELTY_KEYWORDS if keyword in found]
         
         return components
 
@@ -166,20 +252,18 @@ class PriorArtRetriever:
     def retrieve(self, abstract: str, top_k: int = 5) -> List[Dict[str, any]]:
         """Retrieve top-k most relevant prior art with metadata"""
         try:
-            query_embedding = self.mm.embedding_model.encode(
-                [abstract], 
-                convert_to_numpy=True
-            )
-            distances, indices = self.mm.index.search(query_embedding, top_k)
+            # MiniLM's tokenizer lowercases and splits on whitespace, so this key maps
+            # re-submitted abstracts that differ only in case/spacing to the same search
+            cosine, scores, indices = _search_prior_art(" ".join(abstract.lower().split()), top_k)
             
             prior_art = []
-            for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-                if idx < len(self.mm.metadata):
+            for i, (score, idx) in enumerate(zip(scores, indices)):
+                if 0 <= idx < len(self.mm.metadata):
                     patent_data = self.mm.metadata[idx]
                     prior_art.append({
                         'rank': i + 1,
-                        'distance': float(dist),
-                        'similarity': 1.0 / (1.0 + float(dist)),
+                        'distance': 1.0 - float(score) if cosine else float(score),
+                        'similarity': float(score) if cosine else 1.0 / (1.0 + float(score)),
                         'abstract': patent_data.get('abstract', ''),
                         'title': patent_data.get('title', ''),
                         'patent_id': patent_data.get('patent_id', f'PRIOR-{idx}')
@@ -401,11 +485,23 @@ class ImprovedGenerationConfig:
 class ClaimGenerator:
     """Generate patent claims with Indian Patent Office compliance"""
     
+    # Claim 1 is one sentence: once the required wherein clauses are written, the first
+    # full stop (not a decimal point or an abbreviation such as "e.g.") ends it, so
+    # decoding can stop there
+    CLAIM_1_MIN_WHEREIN = 3
+    WHEREIN = re.compile(r'\bwherein\b', re.IGNORECASE)
+    ABBREVIATIONS = ("e.g", "i.e", "etc", "approx", "viz", "vs", "fig", "no")
+    SENTENCE_END = re.compile(
+        r'[^\d\s]' + "".join(rf'(?<!\b{re.escape(abbr)})' for abbr in ABBREVIATIONS) + r'\.(?=\s)',
+        re.IGNORECASE
+    )
+    
     def __init__(self, model_manager: ModelManager):
         self.mm = model_manager
         self.llm = model_manager.llm
         self.post_processor = ClaimPostProcessor()
         self.max_retries = 2
+        self.on_text = None  # Optional callback for streaming the claim being drafted
     
     def _validate_claim_quality(self, claim_text: str, claim_num: int) -> float:
         """Score claim quality (0-1)"""
@@ -439,6 +535,15 @@ class ClaimGenerator:
         
         return score
     
+    @classmethod
+    def _claim_1_end(cls, text: str) -> Optional[int]:
+        """Offset just past the full stop that completes Claim 1, or None while it is still open."""
+        clauses = list(islice(cls.WHEREIN.finditer(text), cls.CLAIM_1_MIN_WHEREIN))
+        if len(clauses) < cls.CLAIM_1_MIN_WHEREIN:
+            return None
+        end = cls.SENTENCE_END.search(text, clauses[-1].end())
+        return end.end() if end else None
+    
     def generate_claim_1(self, abstract: str, components: Dict, 
                         prior_art_context: str) -> Dict[str, any]:
         """Generate Claim 1 with enhanced structure and verification"""
@@ -460,14 +565,19 @@ class ClaimGenerator:
             try:
                 params = ImprovedGenerationConfig.get_generation_params('claim_1')
                 
-                output = self.llm(
-                    prompt=prompt,
+                output = run_completion(
+                    self.llm, prompt, self.on_text, prefix="1.",
+                    should_stop=lambda text: self._claim_1_end(text) is not None,
                     max_tokens=PatentConfig.MAX_TOKENS_CLAIM1,
                     **params,
                     stop=ImprovedGenerationConfig.get_stop_sequences_for_claim(1)
                 )
+                # Drop whatever was decoded past the closing full stop
+                end = self._claim_1_end(output)
+                if end is not None:
+                    output = output[:end]
                 
-                claim_text = "1." + output["choices"][0]["text"].strip()
+                claim_text = "1." + output.strip()
                 
                 # Clean the claim
                 claim_text = self.post_processor.clean_claim_text(claim_text, 1)
@@ -604,27 +714,29 @@ NOW GENERATE CLAIM 1 FOR THE GIVEN INVENTION:
         else:
             feature = "component"
         
+        # Everything up to FEATURE is identical for claims 2-8, so after the first of them
+        # llama.cpp (and llama-server's slots) reuse that prefix's KV state and only the
+        # per-claim tail is prefilled
         prompt = f"""Write ONE dependent claim in Indian Patent Office format.
 
 INDEPENDENT CLAIM (Claim 1):
 {claim_1_text[:500]}...
 
 DEVICE: {device_name}
-FEATURE TO ELABORATE: {feature}
-
-WRITE CLAIM {claim_num} (depends on claim {depends_on}):
 
 FORMAT:
-{claim_num}. The {device_name} as claimed in claim {depends_on}, wherein [one specific technical limitation that adds novelty].
+N. The {device_name} as claimed in claim M, wherein [one specific technical limitation that adds novelty].
 
 REQUIREMENTS:
-✓ Start with "{claim_num}. The {device_name} as claimed in claim {depends_on}, wherein"
+✓ Start with "N. The {device_name} as claimed in claim M, wherein" (N = claim number, M = parent claim)
 ✓ Add ONE specific technical detail/limitation
 ✓ Be concise (1-2 sentences maximum)
 ✓ Include reference number if applicable
 ✓ End with period
 
-WRITE NOW:
+FEATURE TO ELABORATE: {feature}
+
+WRITE CLAIM {claim_num} (depends on claim {depends_on}) NOW:
 
 {claim_num}. The"""
 
@@ -635,14 +747,14 @@ WRITE NOW:
             try:
                 params = ImprovedGenerationConfig.get_generation_params('dependent')
                 
-                output = self.llm(
-                    prompt=prompt,
+                output = run_completion(
+                    self.llm, prompt, self.on_text, prefix=f"{claim_num}. The",
                     max_tokens=PatentConfig.MAX_TOKENS_DEPENDENT,
                     **params,
                     stop=ImprovedGenerationConfig.get_stop_sequences_for_claim(claim_num)
                 )
                 
-                claim_text = f"{claim_num}. The" + output["choices"][0]["text"].strip()
+                claim_text = f"{claim_num}. The" + output.strip()
                 
                 # Clean the claim
                 claim_text = self.post_processor.clean_claim_text(claim_text, claim_num)
@@ -717,14 +829,14 @@ WRITE NOW:
             try:
                 params = ImprovedGenerationConfig.get_generation_params('method')
                 
-                output = self.llm(
-                    prompt=prompt,
+                output = run_completion(
+                    self.llm, prompt, self.on_text, prefix="9. A method for",
                     max_tokens=PatentConfig.MAX_TOKENS_METHOD,
                     **params,
                     stop=ImprovedGenerationConfig.get_stop_sequences_for_claim(9)
                 )
                 
-                claim_text = "9. A method for" + output["choices"][0]["text"].strip()
+                claim_text = "9. A method for" + output.strip()
                 
                 # Clean the claim
                 claim_text = self.post_processor.clean_claim_text(claim_text, 9)
@@ -750,11 +862,12 @@ WRITE NOW:
     
     def generate_method_subclaims(self, claim_9_text: str, device_name: str) -> List[str]:
         """Generate Claims 10 and 11 (dependent on method claim 9)"""
+        return [self.generate_method_subclaim(claim_num, claim_9_text) for claim_num in (10, 11)]
+    
+    def generate_method_subclaim(self, claim_num: int, claim_9_text: str) -> str:
+        """Generate one dependent method claim (10 or 11)"""
         
-        claims = []
-        
-        for claim_num in [10, 11]:
-            prompt = f"""Write ONE dependent method claim.
+        prompt = f"""Write ONE dependent method claim.
 
 METHOD CLAIM (Claim 9):
 {claim_9_text[:400]}...
@@ -768,45 +881,43 @@ WRITE NOW:
 
 {claim_num}. The method"""
 
-            best_claim = None
-            best_score = 0
-            
-            for attempt in range(self.max_retries):
-                try:
-                    params = ImprovedGenerationConfig.get_generation_params('dependent')
-                    
-                    output = self.llm(
-                        prompt=prompt,
-                        max_tokens=300,
-                        **params,
-                        stop=ImprovedGenerationConfig.get_stop_sequences_for_claim(claim_num)
-                    )
-                    
-                    claim_text = f"{claim_num}. The method" + output["choices"][0]["text"].strip()
-                    
-                    # Clean the claim
-                    claim_text = self.post_processor.clean_claim_text(claim_text, claim_num)
-                    
-                    # Validate
-                    score = self._validate_claim_quality(claim_text, claim_num)
-                    
-                    if score > best_score:
-                        best_claim = claim_text
-                        best_score = score
+        best_claim = None
+        best_score = 0
+        
+        for attempt in range(self.max_retries):
+            try:
+                params = ImprovedGenerationConfig.get_generation_params('dependent')
+                
+                output = run_completion(
+                    self.llm, prompt, self.on_text, prefix=f"{claim_num}. The method",
+                    max_tokens=300,
+                    **params,
+                    stop=ImprovedGenerationConfig.get_stop_sequences_for_claim(claim_num)
+                )
+                
+                claim_text = f"{claim_num}. The method" + output.strip()
+                
+                # Clean the claim
+                claim_text = self.post_processor.clean_claim_text(claim_text, claim_num)
+                
+                # Validate
+                score = self._validate_claim_quality(claim_text, claim_num)
+                
+                if score > best_score:
+                    best_claim = claim_text
+                    best_score = score
+                
+                if score >= 0.8:
+                    break
                     
-                    if score >= 0.8:
-                        break
-                        
-                except Exception as e:
-                    print(f"Claim {claim_num} generation attempt {attempt + 1} failed: {e}")
-                    continue
-            
-            if best_claim is None:
-                best_claim = f"{claim_num}. The method as claimed in claim 9, wherein the processing includes optimizing parameters based on real-time conditions."
-            
-            claims.append(best_claim)
+            except Exception as e:
+                print(f"Claim {claim_num} generation attempt {attempt + 1} failed: {e}")
+                continue
         
-        return claims
+        if best_claim is None:
+            best_claim = f"{claim_num}. The method as claimed in claim 9, wherein the processing includes optimizing parameters based on real-time conditions."
+        
+        return best_claim
 
 
 # === FINAL QUALITY CHECKER ===
@@ -825,7 +936,7 @@ class FinalQualityChecker:
         fixes_applied = []
         
         # 1. Remove all artifacts
-        if re.search(r'<\||===|---', claims_text):
+        if ClaimValidator.ARTIFACTS.search(claims_text):
             claims_text = re.sub(r'<\|[^>]*\|>', '', claims_text)
             claims_text = re.sub(r'===+', '', claims_text)
             claims_text = re.sub(r'---+', '', claims_text)
@@ -866,6 +977,21 @@ class FinalQualityChecker:
 class ClaimFormatter:
     """Format claims in Indian Patent Office style with proper layout"""
     
+    # Built once: textwrap.fill() constructs a new TextWrapper on every call
+    DEPENDENT_WRAPPER = textwrap.TextWrapper(width=70, break_long_words=False,
+                                             break_on_hyphens=False, subsequent_indent='   ')
+    SUBCLAIM_WRAPPER = textwrap.TextWrapper(width=70, break_long_words=False,
+                                            subsequent_indent='   ')
+    
+    @staticmethod
+    def _append_numbered(output: List[str], lines: List[str], line_counter: int) -> int:
+        """Append lines, right-aligning the line number on every fifth; return the next number."""
+        for line in lines or [""]:  # An empty claim still takes one line, as with fill()
+            output.append(f"{line:<70}{line_counter:>5}" if line_counter % 5 == 0 else line)
+            line_counter += 1
+        output.append("")
+        return line_counter
+    
     @staticmethod
     def format_complete_claims(claim_1: Dict, dependent_claims: List[str],
                               method_claim_9: str, method_subclaims: List[str],
@@ -878,61 +1004,21 @@ class ClaimFormatter:
         output.append("WE CLAIM")
         output.append("")
         
-        line_counter = 1
+        append = ClaimFormatter._append_numbered
         
         # === CLAIM 1 ===
-        claim_1_lines = claim_1['claim_text'].split('\n')
-        for line in claim_1_lines:
-            if line_counter % 5 == 0:
-                output.append(f"{line:<70}{line_counter:>5}")
-            else:
-                output.append(line)
-            line_counter += 1
-        output.append("")
+        line_counter = append(output, claim_1['claim_text'].split('\n'), 1)
         
         # === DEPENDENT CLAIMS 2-8 ===
         for dep_claim in dependent_claims:
-            wrapped = textwrap.fill(
-                dep_claim,
-                width=70,
-                break_long_words=False,
-                break_on_hyphens=False,
-                subsequent_indent='   '
-            )
-            
-            for line in wrapped.split('\n'):
-                if line_counter % 5 == 0:
-                    output.append(f"{line:<70}{line_counter:>5}")
-                else:
-                    output.append(line)
-                line_counter += 1
-            output.append("")
+            line_counter = append(output, ClaimFormatter.DEPENDENT_WRAPPER.wrap(dep_claim), line_counter)
         
         # === METHOD CLAIM 9 ===
-        for line in method_claim_9.split('\n'):
-            if line_counter % 5 == 0:
-                output.append(f"{line:<70}{line_counter:>5}")
-            else:
-                output.append(line)
-            line_counter += 1
-        output.append("")
+        line_counter = append(output, method_claim_9.split('\n'), line_counter)
         
         # === METHOD SUBCLAIMS 10-11 ===
         for subclaim in method_subclaims:
-            wrapped = textwrap.fill(
-                subclaim,
-                width=70,
-                break_long_words=False,
-                subsequent_indent='   '
-            )
-            
-            for line in wrapped.split('\n'):
-                if line_counter % 5 == 0:
-                    output.append(f"{line:<70}{line_counter:>5}")
-                else:
-                    output.append(line)
-                line_counter += 1
-            output.append("")
+            line_counter = append(output, ClaimFormatter.SUBCLAIM_WRAPPER.wrap(subclaim), line_counter)
         
         return "\n".join(output)
 
@@ -941,6 +1027,23 @@ class ClaimFormatter:
 class ClaimValidator:
     """Comprehensive validation with detailed feedback"""
     
+    # Compiled once; validate() runs for every generated claim set and every re-check
+    CLAIM_NUMBER = re.compile(r'^\s*(\d+)\.', re.MULTILINE)
+    CLAIM_1 = re.compile(r'^1\.(.+?)(?=^[2-9]\.|\Z)', re.DOTALL | re.MULTILINE)
+    REFERENCE_NUMBER = re.compile(r'\((\d+)\)')
+    METHOD_CLAIM_9 = re.compile(r'9\.\s+A method for', re.IGNORECASE)
+    DEPENDENT_CLAIM = re.compile(r'(\d+)\.\s+The\s+\w+\s+as claimed in claim (\d+)')
+    ARTIFACTS = re.compile(r'<\||===|---')
+    LINE_NUMBER = re.compile(r'\s+(\d+)')
+    INDENTED_LINE = re.compile(r'^\s{3,}', re.MULTILINE)
+    INDEPENDENT_CLAIM = re.compile(r'^\d+\.\s+(?:An?|A method)', re.MULTILINE)
+    METHOD_CLAIM = re.compile(r'A method for', re.IGNORECASE)
+    
+    @staticmethod
+    def _has_at_least(pattern: re.Pattern, text: str, count: int) -> bool:
+        """Whether pattern occurs at least count times, without scanning past that point."""
+        return len(list(islice(pattern.finditer(text), count))) == count
+    
     @staticmethod
     def validate(claims_text: str) -> Dict[str, any]:
         """Validate claims against Indian Patent Office standards"""
@@ -954,62 +1057,61 @@ class ClaimValidator:
             issues.append("❌ Missing 'WE CLAIM' header (mandatory)")
         
         # Check claim numbering
-        claim_numbers = re.findall(r'^\s*(\d+)\.', claims_text, re.MULTILINE)
+        claim_numbers = ClaimValidator.CLAIM_NUMBER.findall(claims_text)
         if len(claim_numbers) < 9:
             issues.append(f"❌ Insufficient claims: {len(claim_numbers)} (minimum 9 expected)")
         elif len(claim_numbers) < 11:
             warnings.append(f"⚠️  Only {len(claim_numbers)} claims (11 recommended)")
         
         # Validate Claim 1
-        claim_1_match = re.search(r'^1\.(.+?)(?=^[2-9]\.|\Z)', claims_text, re.DOTALL | re.MULTILINE)
+        claim_1_match = ClaimValidator.CLAIM_1.search(claims_text)
         if claim_1_match:
             claim_1_text = claim_1_match.group(1)
+            claim_1_lower = claim_1_text.lower()
             
-            if 'comprising' not in claim_1_text.lower():
+            if 'comprising' not in claim_1_lower:
                 issues.append("❌ Claim 1 missing 'comprising' (mandatory)")
             
-            wherein_count = claim_1_text.lower().count('wherein')
+            wherein_count = claim_1_lower.count('wherein')
             if wherein_count == 0:
                 issues.append("❌ Claim 1 has no 'wherein' clauses (minimum 2 required)")
             elif wherein_count < 2:
                 warnings.append(f"⚠️  Claim 1 has only {wherein_count} 'wherein' clause (3-5 recommended)")
             
             # Check for reference numbers
-            ref_numbers = re.findall(r'\((\d+)\)', claim_1_text)
-            if len(ref_numbers) < 3:
+            if not ClaimValidator._has_at_least(ClaimValidator.REFERENCE_NUMBER, claim_1_text, 3):
                 warnings.append("⚠️  Few reference numbers in Claim 1 (use (1), (2), (3) etc.)")
         
         # Check for method claim
-        method_claim = re.search(r'9\.\s+A method for', claims_text, re.IGNORECASE)
+        method_claim = ClaimValidator.METHOD_CLAIM_9.search(claims_text)
         if not method_claim:
             warnings.append("⚠️  No method claim found at position 9")
         
         # Check dependent claim format
-        dep_claims = re.findall(r'(\d+)\.\s+The\s+\w+\s+as claimed in claim (\d+)', claims_text)
+        dep_claims = ClaimValidator.DEPENDENT_CLAIM.findall(claims_text)
         if len(dep_claims) < 6:
             warnings.append(f"⚠️  Only {len(dep_claims)} dependent claims found")
         
         # Check for artifacts
-        if re.search(r'<\||===|---', claims_text):
+        if ClaimValidator.ARTIFACTS.search(claims_text):
             issues.append("❌ LLM artifacts found in claims (must be removed)")
         
         # Check line numbers
-        line_number_matches = re.findall(r'\s+(\d+)', claims_text, re.MULTILINE)
-        if len(line_number_matches) < 5:
+        if not ClaimValidator._has_at_least(ClaimValidator.LINE_NUMBER, claims_text, 5):
             suggestions.append("💡 Add line numbers every 5 lines on right margin")
         
         # Check for proper indentation
-        if not re.search(r'^\s{3,}', claims_text, re.MULTILINE):
+        if not ClaimValidator.INDENTED_LINE.search(claims_text):
             suggestions.append("💡 Use proper indentation for sub-elements")
         
         # Calculate statistics
         stats = {
             'total_claims': len(claim_numbers),
-            'independent_claims': len(re.findall(r'^\d+\.\s+(?:An?|A method)', claims_text, re.MULTILINE)),
+            'independent_claims': len(ClaimValidator.INDEPENDENT_CLAIM.findall(claims_text)),
             'dependent_claims': len(dep_claims),
-            'method_claims': len(re.findall(r'A method for', claims_text, re.IGNORECASE)),
+            'method_claims': len(ClaimValidator.METHOD_CLAIM.findall(claims_text)),
             'wherein_clauses_total': claims_text.lower().count('wherein'),
-            'has_reference_numbers': len(re.findall(r'\(\d+\)', claims_text)) > 5,
+            'has_reference_numbers': ClaimValidator._has_at_least(ClaimValidator.REFERENCE_NUMBER, claims_text, 6),
         }
         
         return {
@@ -1099,7 +1201,8 @@ class PatentClaimsPipeline:
     def generate_complete_claims(self, abstract: str, 
                                 applicant_name: str = "[Your Institution/Company Name]",
                                 top_k_prior_art: int = 5,
-                                verbose: bool = True) -> Dict[str, any]:
+                                verbose: bool = True,
+                                on_text=None) -> Dict[str, any]:
         """
         Complete pipeline: abstract → formatted claims with validation
         
@@ -1108,6 +1211,7 @@ class PatentClaimsPipeline:
             applicant_name: Name of patent applicant
             top_k_prior_art: Number of prior art patents to retrieve
             verbose: Print progress messages
+            on_text: Optional callback receiving each claim as it streams
         
         Returns:
             Dictionary with claims text, validation results, and metadata
@@ -1120,6 +1224,14 @@ class PatentClaimsPipeline:
             print(f"\nInput Abstract ({len(abstract)} chars):")
             print(f"{abstract[:200]}...\n")
         
+        self.generator.on_text = on_text
+        
+        # Prior art (MiniLM forward + FAISS search, both mostly outside the GIL) is retrieved
+        # on a worker thread while the components are extracted, instead of after them
+        pool = ThreadPoolExecutor(max_workers=1)
+        prior_art_future = pool.submit(self.retriever.retrieve, abstract, top_k=top_k_prior_art)
+        pool.shutdown(wait=False)  # The submitted search still runs; the worker exits after it
+        
         # Step 1: Extract components
         if verbose:
             print("[1/6] Extracting components from abstract...")
@@ -1134,7 +1246,7 @@ class PatentClaimsPipeline:
         # Step 2: Retrieve prior art
         if verbose:
             print(f"\n[2/6] Retrieving top-{top_k_prior_art} similar prior art patents...")
-        prior_art = self.retriever.retrieve(abstract, top_k=top_k_prior_art)
+        prior_art = prior_art_future.result()
         prior_art_context = self.retriever.format_for_context(prior_art)
         
         if verbose and prior_art:
@@ -1150,36 +1262,31 @@ class PatentClaimsPipeline:
             print(f"   ✓ Claim 1 generated ({len(claim_1['claim_text'])} chars)")
             print(f"   ✓ Quality score: {claim_1.get('quality_score', 0):.2f}")
         
-        # Step 4: Generate dependent claims 2-8
+        # Step 4: Generate dependent claims 2-8 and method claim 9 (they only need claim 1)
         if verbose:
-            print(f"\n[4/6] Generating dependent claims 2-8...")
-        dependent_claims = []
-        for i in range(2, 9):
-            if verbose:
-                print(f"   Generating claim {i}...", end=" ")
-            dep_claim = self.generator.generate_dependent_claim(
-                i, claim_1['claim_text'], claim_1['device_name'], 
-                components, abstract
-            )
-            dependent_claims.append(dep_claim)
-            if verbose:
-                print("✓")
+            print(f"\n[4/6] Generating dependent claims 2-8 and method claim 9...")
+        claims_2_to_9 = self._run_claim_jobs(
+            [partial(self.generator.generate_dependent_claim,
+                     i, claim_1['claim_text'], claim_1['device_name'], components, abstract)
+             for i in range(2, 9)] +
+            [partial(self.generator.generate_method_claim_9,
+                     claim_1['claim_text'], claim_1['device_name'], abstract, components)]
+        )
+        dependent_claims, method_claim_9 = claims_2_to_9[:-1], claims_2_to_9[-1]
         
         if verbose:
-            print(f"   ✓ Generated {len(dependent_claims)} dependent claims")
+            print(f"   ✓ Generated {len(dependent_claims)} dependent claims and method claim 9")
         
-        # Step 5: Generate method claims 9-11
+        # Step 5: Generate method subclaims 10-11
         if verbose:
-            print(f"\n[5/6] Generating method claims 9-11...")
-        method_claim_9 = self.generator.generate_method_claim_9(
-            claim_1['claim_text'], claim_1['device_name'], abstract, components
-        )
-        method_subclaims = self.generator.generate_method_subclaims(
-            method_claim_9, claim_1['device_name']
+            print(f"\n[5/6] Generating method claims 10-11...")
+        method_subclaims = self._run_claim_jobs(
+            [partial(self.generator.generate_method_subclaim, claim_num, method_claim_9)
+             for claim_num in (10, 11)]
         )
         
         if verbose:
-            print(f"   ✓ Generated method claim and 2 subclaims")
+            print(f"   ✓ Generated 2 method subclaims")
         
         # Step 6: Format and validate
         if verbose:
@@ -1222,6 +1329,28 @@ class PatentClaimsPipeline:
             }
         }
     
+    def _run_claim_jobs(self, jobs: List[Callable[[], Any]]) -> List[Any]:
+        """
+        Run claim generations that do not depend on each other, in order.
+        
+        llama-server decodes concurrent requests in one batch (and its slots reuse the shared
+        claim-1 prompt prefix), so there they all run at once; the in-process model decodes
+        one sequence at a time and runs them sequentially.
+        """
+        if len(jobs) < 2 or not isinstance(self.model_manager.llm, LlamaServerClient):
+            return [job() for job in jobs]
+        
+        # Interleaved partial claims would garble the live preview: stream only the results
+        on_text, self.generator.on_text = self.generator.on_text, None
+        try:
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                results = list(executor.map(lambda job: job(), jobs))
+        finally:
+            self.generator.on_text = on_text
+        if on_text:
+            on_text("\n\n".join(results))
+        return results
+    
     def save_claims_to_file(self, results: Dict, output_path: str):
         """Save generated claims to file"""
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -1256,7 +1385,8 @@ class PatentClaimsPipeline:
 # === Convenience Function ===
 def generate_claims_from_abstract(abstract: str, 
                                  applicant_name: str = "[Your Institution/Company Name]",
-                                 verbose: bool = True) -> str:
+                                 verbose: bool = True,
+                                 on_text=None) -> str:
     """
     Simple function to generate claims from abstract
     
@@ -1264,6 +1394,7 @@ def generate_claims_from_abstract(abstract: str,
         abstract: Patent abstract text
         applicant_name: Applicant name for header
         verbose: Print progress
+        on_text: Optional callback receiving each claim as it streams
     
     Returns:
         Formatted claims text
@@ -1272,7 +1403,8 @@ def generate_claims_from_abstract(abstract: str,
     results = pipeline.generate_complete_claims(
         abstract, 
         applicant_name=applicant_name,
-        verbose=verbose
+        verbose=verbose,
+        on_text=on_text
     )
     
     # Print validation report
@@ -1,11 +1,7 @@
-from llama_cpp import Llama
 import re
 from typing import Dict, List
 
-
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
-
-llm = Llama(model_path=LLM_PATH, device="auto", n_ctx=8192, n_threads=4, verbose=False)  # Increased context
+from llm_loader import get_llm, run_completion
 
 
 def extract_components_with_numerals(abstract: str, claims: str) -> Dict[str, List]:
@@ -46,7 +42,8 @@ def extract_components_with_numerals(abstract: str, claims: str) -> Dict[str, Li
 
 def generate_detailed_description(abstract: str, claims: str, drawing_summary: str,
                                  field_of_invention: str = "", background: str = "",
-                                 objects: str = "", max_attempts: int = 2) -> Dict[str, any]:
+                                 objects: str = "", max_attempts: int = 2,
+                                 on_text=None, llm=None) -> Dict[str, any]:
     """
     Generate 'Detailed Description of the Invention' matching Indian Patent Office format.
     
@@ -161,10 +158,14 @@ The present invention as herein described relates to"""
     best_result = None
     best_score = float('inf')
     
+    if llm is None:
+        llm = get_llm()
+    
     for attempt in range(max_attempts):
         try:
-            response = llm(
-                prompt=prompt,
+            opening = "The present invention as herein described relates to"
+            text = run_completion(
+                llm, prompt, on_text, prefix=opening,
                 max_tokens=4096,  # Much longer for detailed description
                 temperature=0.3 if attempt == 0 else 0.35,
                 stop=["WE CLAIM", "CLAIMS", "\n\n\n\n\n\n"],
@@ -172,7 +173,7 @@ The present invention as herein described relates to"""
                 repeat_penalty=1.15
             )
             
-            raw_text = "The present invention as herein described relates to" + response["choices"][0]["text"].strip()
+            raw_text = opening + text.strip()
             cleaned_text = clean_detailed_description(raw_text)
             validation = validate_detailed_description(cleaned_text, components)
             
@@ -0,0 +1,122 @@
+import re
+from typing import Dict
+
+from llm_loader import get_llm, run_completion
+from generate_brief_description import clean_brief_description, extract_figure_info_from_abstract
+from generate_detailed_description import clean_detailed_description, extract_components_with_numerals
+
+
+# Delimiters the model writes between sections; the short sections come first so a
+# completion cut off by max_tokens only truncates the detailed description.
+SECTION_MARKERS = {
+    "BRIEF": "brief_description",
+    "SUMMARY": "summary_drawings",
+    "DETAILED": "detailed_description",
+}
+MARKER_PATTERN = re.compile(r'<<<\s*(BRIEF|SUMMARY|DETAILED)\s*>>>')
+
+
+def split_bundle(text: str) -> Dict[str, str]:
+    """Split the delimited model output into its three sections."""
+    sections = {key: "" for key in SECTION_MARKERS.values()}
+    parts = MARKER_PATTERN.split(text)
+
+    # parts = [preamble, marker, body, marker, body, ...]
+    for marker, body in zip(parts[1::2], parts[2::2]):
+        key = SECTION_MARKERS[marker]
+        if not sections[key]:
+            sections[key] = body.strip()
+
+    return sections
+
+
+def generate_drawing_bundle(abstract: str, drawing_summary: str = "", claims: str = "",
+                            num_figures: int = None, on_text=None, llm=None) -> Dict[str, str]:
+    """
+    Generate the Brief Description of the Drawings, the Summary of Drawings and the
+    Detailed Description in ONE completion.
+
+    The three sections share the same abstract and drawing summary, so a single
+    prompt pays the prefill over that context once instead of three times.
+
+    Returns:
+        Dictionary with brief_description, summary_drawings and detailed_description
+    """
+
+    fig_info = extract_figure_info_from_abstract(abstract)
+    if num_figures is None:
+        num_figures = fig_info['suggested_count']
+
+    components = extract_components_with_numerals(abstract, claims)
+    component_list = "\n".join([f"   • {comp} {num}" for comp, num in list(components.items())[:10]])
+
+    prompt = f"""You are a patent attorney drafting the drawing-related sections of an Indian Complete Specification patent.
+
+INVENTION ABSTRACT:
+{abstract}
+
+{f"CLAIMS (FIRST CLAIM):{chr(10)}{claims[:800]}..." if claims else ""}
+
+DRAWINGS:
+{drawing_summary if drawing_summary else "No drawings provided."}
+
+NUMBER OF FIGURES: {num_figures}
+
+COMPONENT REFERENCE NUMERALS (use these throughout):
+{component_list}
+
+Write THREE sections, each starting with its marker on its own line:
+
+<<<BRIEF>>>
+Exactly {num_figures} lines, one per figure, in the format:
+Figure X: illustrates [description] according to the present invention.
+(Data figures such as comparative results omit "according to the present invention".)
+
+<<<SUMMARY>>>
+One paragraph summarising what the drawings show as a set and how they relate to each other.
+
+<<<DETAILED>>>
+The Detailed Description of the Invention. Start with "The present invention as herein described relates to",
+use "Referring to Figures 1 to {num_figures}, ...", use the reference numerals in brackets ([1], [2], [3a]),
+include a "Working:" section with step-by-step operation, use cases, and numbered technical advantages.
+
+RULES:
+1. Use the markers exactly as shown: <<<BRIEF>>>, <<<SUMMARY>>>, <<<DETAILED>>>
+2. No headings or markdown inside the sections
+3. Technical, formal language throughout
+
+NOW WRITE:
+
+<<<BRIEF>>>
+Figure 1:"""
+
+    if llm is None:
+        llm = get_llm()
+
+    text = run_completion(
+        llm, prompt, on_text, prefix="<<<BRIEF>>>\nFigure 1:",
+        max_tokens=5120,
+        temperature=0.25,
+        stop=["\n\n\n\n\n"],
+        top_p=0.85,
+        repeat_penalty=1.15
+    )
+
+    sections = split_bundle("<<<BRIEF>>>\nFigure 1:" + text)
+    sections["brief_description"] = clean_brief_description(sections["brief_description"])
+    sections["detailed_description"] = clean_detailed_description(sections["detailed_description"])
+
+    return sections
+
+
+if __name__ == "__main__":
+    sample_abstract = """An IoT-based remote monitoring system for human-animal conflict mitigation comprising sensor nodes with PIR and camera modules, an edge AI unit for animal detection, a dual LoRa and GSM communication module, and a multi-modal alerting unit including sirens, lights and SMS notifications."""
+
+    result = generate_drawing_bundle(sample_abstract)
+
+    for key in SECTION_MARKERS.values():
+        print("=" * 80)
+        print(key.replace("_", " ").upper())
+        print("=" * 80)
+        print(result[key] or "⚠️ Section missing from model output.")
+        print()
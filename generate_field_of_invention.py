@@ -1,20 +1,7 @@
-from llama_cpp import Llama
 import re
 from typing import Dict, List
 
-
-# Path to your local GGUF model
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
-
-
-
-# Load the model once with optimized settings
-llm = Llama(
-    model_path=LLM_PATH, device="auto",
-    n_ctx=4096,  # Increased for better context
-    n_threads=4,
-    n_batch=512
-)
+from llm_loader import get_llm, run_completion
 
 
 def extract_technical_components(abstract: str) -> Dict[str, any]:
@@ -160,7 +147,8 @@ def validate_field_text(text: str) -> Dict[str, any]:
     }
 
 
-def generate_field_of_invention(abstract: str, max_attempts: int = 3) -> Dict[str, any]:
+def generate_field_of_invention(abstract: str, max_attempts: int = 3, on_text=None,
+                                llm=None) -> Dict[str, any]:
     """
     Generates the 'Field of the Invention' section matching Indian Patent Office format.
     
@@ -172,6 +160,7 @@ def generate_field_of_invention(abstract: str, max_attempts: int = 3) -> Dict[st
     Args:
         abstract: The patent abstract text
         max_attempts: Number of generation attempts if validation fails
+        on_text: Optional callback receiving the partial text while it streams
         
     Returns:
         Dictionary containing the generated field text and metadata
@@ -221,10 +210,13 @@ The present invention"""
     best_result = None
     best_score = float('inf')
     
+    if llm is None:
+        llm = get_llm()
+    
     for attempt in range(max_attempts):
         try:
-            response = llm(
-                prompt=prompt,
+            text = run_completion(
+                llm, prompt, on_text, prefix="The present invention",
                 max_tokens=300,
                 temperature=0.25 if attempt == 0 else 0.35 + (attempt * 0.1),
                 stop=["\n\nBACKGROUND", "BACKGROUND OF", "\n\n\n", "Summary:", "Claims:"],
@@ -232,7 +224,7 @@ The present invention"""
                 repeat_penalty=1.18
             )
             
-            raw_text = "The present invention" + response["choices"][0]["text"].strip()
+            raw_text = "The present invention" + text.strip()
             cleaned_text = clean_field_text(raw_text)
             validation = validate_field_text(cleaned_text)
             
@@ -290,7 +282,7 @@ def format_for_patent_document(field_text: str, include_heading: bool = True) ->
     return output
 
 
-def generate_alternative_versions(abstract: str) -> List[Dict]:
+def generate_alternative_versions(abstract: str, llm=None) -> List[Dict]:
     """
     Generate multiple variations with different emphasis.
     """
@@ -332,10 +324,13 @@ The present invention"""
     prompts = [prompt1, prompt2, prompt3]
     labels = ["Technology-focused", "Application-focused", "Problem-solution focused"]
     
+    if llm is None:
+        llm = get_llm()
+    
     for i, prompt in enumerate(prompts):
         try:
-            response = llm(
-                prompt=prompt,
+            text = run_completion(
+                llm, prompt,
                 max_tokens=280,
                 temperature=0.3 + (i * 0.1),
                 stop=["\n\nBACKGROUND", "\n\n\n"],
@@ -343,7 +338,7 @@ The present invention"""
                 repeat_penalty=1.2
             )
             
-            raw_text = "The present invention" + response["choices"][0]["text"].strip()
+            raw_text = "The present invention" + text.strip()
             cleaned = clean_field_text(raw_text)
             validation = validate_field_text(cleaned)
             
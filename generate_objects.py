@@ -1,20 +1,7 @@
-from llama_cpp import Llama
 import re
 from typing import Dict, List
 
-
-# Path to your local Phi-3 model
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
-
-
-
-# Load the model once
-llm = Llama(
-    model_path=LLM_PATH, device="auto",
-    n_ctx=4096,
-    n_threads=4,
-    verbose=False
-)
+from llm_loader import get_llm, run_completion
 
 
 def extract_invention_features(abstract: str) -> Dict[str, any]:
@@ -145,7 +132,8 @@ def validate_objects(text: str) -> Dict[str, any]:
     }
 
 
-def generate_objects_of_invention(abstract: str, max_attempts: int = 3) -> Dict[str, any]:
+def generate_objects_of_invention(abstract: str, max_attempts: int = 3, on_text=None,
+                                  llm=None) -> Dict[str, any]:
     """
     Generate 'Objects of the Invention' section matching Indian Patent Office format.
     
@@ -157,6 +145,7 @@ def generate_objects_of_invention(abstract: str, max_attempts: int = 3) -> Dict[
     Args:
         abstract: The patent abstract text
         max_attempts: Number of generation attempts if validation fails
+        on_text: Optional callback receiving the partial text while it streams
         
     Returns:
         Dictionary containing the generated objects and metadata
@@ -236,10 +225,13 @@ One or more"""
     best_result = None
     best_score = float('inf')
     
+    if llm is None:
+        llm = get_llm()
+    
     for attempt in range(max_attempts):
         try:
-            response = llm(
-                prompt=prompt,
+            text = run_completion(
+                llm, prompt, on_text, prefix="One or more",
                 max_tokens=1200,
                 temperature=0.25 if attempt == 0 else 0.3 + (attempt * 0.1),
                 stop=["SUMMARY OF THE INVENTION", "BRIEF DESCRIPTION", "\n\n\n\n\n"],
@@ -247,7 +239,7 @@ One or more"""
                 repeat_penalty=1.18
             )
             
-            raw_text = "One or more" + response["choices"][0]["text"].strip()
+            raw_text = "One or more" + text.strip()
             cleaned_text = clean_objects(raw_text)
             validation = validate_objects(cleaned_text)
             
@@ -1,18 +1,11 @@
-from llama_cpp import Llama
 import re
 from typing import Dict
 
+from llm_loader import get_llm, run_completion
 
-# Path to your local Phi-3 GGUF model
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
 
-
-
-# Load the model
-llm = Llama(model_path=LLM_PATH, device="auto", n_ctx=4096, n_threads=4, verbose=False)
-
-
-def generate_summary_of_invention(abstract: str, claims: str = "", max_attempts: int = 3) -> Dict[str, any]:
+def generate_summary_of_invention(abstract: str, claims: str = "", max_attempts: int = 3,
+                                  on_text=None, llm=None) -> Dict[str, any]:
     """
     Generate 'SUMMARY OF THE INVENTION' section matching Indian Patent Office format.
     
@@ -70,10 +63,14 @@ Thus according to the basic aspect of the present invention, there is provided""
     best_result = None
     best_score = float('inf')
     
+    if llm is None:
+        llm = get_llm()
+    
     for attempt in range(max_attempts):
         try:
-            response = llm(
-                prompt=prompt,
+            opening = "Thus according to the basic aspect of the present invention, there is provided"
+            text = run_completion(
+                llm, prompt, on_text, prefix=opening,
                 max_tokens=1200,
                 temperature=0.25 if attempt == 0 else 0.3 + (attempt * 0.1),
                 stop=["BRIEF DESCRIPTION", "\n\n\n\n\n"],
@@ -81,7 +78,7 @@ Thus according to the basic aspect of the present invention, there is provided""
                 repeat_penalty=1.18
             )
             
-            raw_text = "Thus according to the basic aspect of the present invention, there is provided" + response["choices"][0]["text"].strip()
+            raw_text = opening + text.strip()
             cleaned_text = clean_summary(raw_text)
             validation = validate_summary(cleaned_text)
             
@@ -169,14 +166,14 @@ def validate_summary(text: str) -> Dict[str, any]:
 
 
 # BACKWARD COMPATIBILITY FUNCTION - For existing app.py
-def summarize_abstract(abstract: str) -> str:
+def summarize_abstract(abstract: str, on_text=None, llm=None) -> str:
     """
     Backward compatibility wrapper for existing app.py.
     Generates SUMMARY OF THE INVENTION section.
     
     Note: This is NOT a condensed summary - it's a structured technical restatement!
     """
-    result = generate_summary_of_invention(abstract)
+    result = generate_summary_of_invention(abstract, on_text=on_text, llm=llm)
     
     if result and result.get("text"):
         return result["text"]
@@ -1,21 +1,7 @@
-from llama_cpp import Llama
 import re
 from typing import Dict, List
 
-
-# Path to your locally downloaded Phi-3 model (.gguf file)
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
-
-
-
-# Load the model ONCE at module level
-llm = Llama(
-    model_path=LLM_PATH, device="auto",
-    n_ctx=4096,
-    n_threads=4,
-    n_batch=512,
-    verbose=False
-)
+from llm_loader import get_llm, run_completion
 
 
 def extract_figure_info_from_abstract(abstract: str) -> Dict[str, any]:
@@ -165,7 +151,8 @@ def validate_brief_description(text: str, expected_count: int = None) -> Dict[st
 
 
 def generate_brief_description(abstract: str, num_figures: int = None, 
-                               figure_descriptions: str = "", max_attempts: int = 3) -> Dict[str, any]:
+                               figure_descriptions: str = "", max_attempts: int = 3,
+                               on_text=None, llm=None) -> Dict[str, any]:
     """
     Generate 'Brief Description of the Drawings' section matching Indian Patent Office format.
     
@@ -183,6 +170,7 @@ def generate_brief_description(abstract: str, num_figures: int = None,
         num_figures: Number of figures (auto-estimated if None)
         figure_descriptions: Optional user-provided figure descriptions
         max_attempts: Number of generation attempts if validation fails
+        on_text: Optional callback receiving the partial text while it streams
         
     Returns:
         Dictionary containing the generated brief description and metadata
@@ -256,10 +244,13 @@ Figure 1:"""
     best_result = None
     best_score = float('inf')
     
+    if llm is None:
+        llm = get_llm()
+    
     for attempt in range(max_attempts):
         try:
-            response = llm(
-                prompt=prompt,
+            text = run_completion(
+                llm, prompt, on_text, prefix="Figure 1:",
                 max_tokens=600,
                 temperature=0.2 if attempt == 0 else 0.25 + (attempt * 0.1),
                 stop=["DETAILED DESCRIPTION", "SUMMARY OF", "\n\n\n\n"],
@@ -267,7 +258,7 @@ Figure 1:"""
                 repeat_penalty=1.2
             )
             
-            raw_text = "Figure 1:" + response["choices"][0]["text"].strip()
+            raw_text = "Figure 1:" + text.strip()
             cleaned_text = clean_brief_description(raw_text)
             validation = validate_brief_description(cleaned_text, num_figures)
             
@@ -308,7 +299,8 @@ Figure 1:"""
     }
 
 # Add this function for backward compatibility with app.py
-def generate_drawing_descriptions(abstract: str, num_figures: int = None, max_attempts: int = 2) -> Dict[str, any]:
+def generate_drawing_descriptions(abstract: str, num_figures: int = None, max_attempts: int = 2,
+                                  on_text=None, llm=None) -> Dict[str, any]:
     """
     Backward compatibility wrapper for existing app.py.
     This function name matches what app.py expects to import.
@@ -323,7 +315,7 @@ def generate_drawing_descriptions(abstract: str, num_figures: int = None, max_at
     Returns:
         Dictionary with generated text and validation results
     """
-    return generate_brief_description(abstract, num_figures, "", max_attempts)
+    return generate_brief_description(abstract, num_figures, "", max_attempts, on_text=on_text, llm=llm)
 
 def format_for_patent_document(brief_desc_text: str, include_heading: bool = True) -> str:
     """
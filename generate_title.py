@@ -1,14 +1,6 @@
-from llama_cpp import Llama
 import re
 
-
-# Path to your local Phi-3 model
-LLM_PATH = "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf"
-
-
-
-# Load the model once
-llm = Llama(model_path=LLM_PATH, device="auto", n_ctx=2048, n_threads=4)
+from llm_loader import get_llm, run_completion
 
 
 # USPTO MPEP 606 forbidden words that get automatically deleted
@@ -201,13 +193,15 @@ def extract_key_features(abstract: str) -> dict:
     return features
 
 
-def generate_title_from_abstract(abstract: str, max_attempts: int = 5) -> dict:
+def generate_title_from_abstract(abstract: str, max_attempts: int = 5, on_text=None,
+                                llm=None) -> dict:
     """
     Generate a patent-quality title from an abstract.
     
     Args:
         abstract: The patent abstract text
         max_attempts: Number of regeneration attempts if validation fails
+        on_text: Optional callback receiving the partial title while it streams
         
     Returns:
         dict with comprehensive results and validation
@@ -260,17 +254,19 @@ Generate ONLY the patent title (no explanation, no prefix, no quotes):"""
     best_result = None
     best_score = -1
     
+    if llm is None:
+        llm = get_llm()
+    
     for attempt in range(max_attempts):
-        response = llm(
-            prompt=prompt,
+        raw_title = run_completion(
+            llm, prompt, on_text,
             max_tokens=60,
             temperature=0.2 if attempt == 0 else 0.3 + (attempt * 0.15),
             stop=["\n\n", "Abstract:", "Explanation:", "Note:", "Example:"],
             top_p=0.85,
             repeat_penalty=1.2
-        )
+        ).strip()
         
-        raw_title = response["choices"][0]["text"].strip()
         cleaned_title = clean_title(raw_title)
         
         validation = validate_title(cleaned_title)
@@ -0,0 +1,331 @@
+"""
+Shared helpers for running the local Phi-3 GGUF model with llama-cpp-python.
+"""
+
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import nullcontext
+from functools import lru_cache
+from typing import Callable, Optional
+
+
+# Where the Phi-3 GGUF is looked for, in order (workspace checkout, Docker image, repo).
+# The default is the Q4_K_M build: decoding is memory-bandwidth bound, so 4-bit weights
+# give roughly twice the tokens/sec of Q8/FP16.
+LLM_PATH_CANDIDATES = (
+    "/workspace/patentdoc-copilot/models/models/phi-3-mini-4k-instruct-q4.gguf",
+    "/app/models/models/phi-3-mini-4k-instruct-q4.gguf",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "phi-3-mini-4k-instruct-q4.gguf"),
+)
+
+# One resolved path for every module, so the same GGUF is never mapped twice under
+# different names. Point PATENTDOC_LLM_PATH at another quantization (see quantize_model.py)
+# to switch; without it the first existing candidate is used.
+LLM_PATH = os.path.realpath(
+    os.environ.get("PATENTDOC_LLM_PATH")
+    or next((path for path in LLM_PATH_CANDIDATES if os.path.exists(path)), LLM_PATH_CANDIDATES[0])
+)
+
+# Optional lighter quantization (e.g. Q3_K_M: a quarter fewer bytes per decoded token than
+# Q4_K, or Q4_0 on CPU) for the long, formulaic descriptive sections: background and brief
+# description of the drawings. Claims and the other sections stay on LLM_PATH.
+FAST_LLM_PATH = os.path.realpath(os.environ["PATENTDOC_FAST_LLM_PATH"]) if os.environ.get("PATENTDOC_FAST_LLM_PATH") else ""
+
+# Lock the mapped weights in RAM (PATENTDOC_MLOCK=1) so the kernel never evicts them and
+# decode never stalls on page faults; only for hosts with RAM to spare for the whole model.
+USE_MLOCK = os.environ.get("PATENTDOC_MLOCK", "0") == "1"
+
+# KV-state cache for prompt prefixes. After each completion llama-cpp stores the evaluated
+# state; a later prompt sharing the longest stored prefix (same abstract and section
+# template, retries, dependent claims) skips that part of the prefill. Set
+# PATENTDOC_PROMPT_CACHE_DIR to keep the states on disk across restarts instead of in RAM.
+PROMPT_CACHE_BYTES = int(os.environ.get("PATENTDOC_PROMPT_CACHE_MB", "2048")) << 20
+PROMPT_CACHE_DIR = os.environ.get("PATENTDOC_PROMPT_CACHE_DIR", "")
+
+
+# Optional llama-server backend. When set, generators send their completions over HTTP
+# instead of loading the GGUF in-process, which lets the server add speculative decoding
+# with a small draft model (lossless, 1.5-3x faster decode on short outputs like titles):
+#   llama-server -m phi-3-mini-4k-instruct-q4.gguf --model-draft draft.gguf --draft 8 --port 8080 \
+#                --parallel 8 --cont-batching
+# With --parallel/--cont-batching the server decodes concurrent requests (Generate All,
+# several browser tabs) in one batch, so they are not serialized on _MODEL_LOCK.
+# Each slot is a separate KV sequence that keeps its last prompt: with prompt caching on
+# (see LlamaServerClient) a request is routed to the slot whose cached prompt it shares the
+# most with (--slot-prompt-similarity, default 0.5), so the background, brief-description
+# and claims prefixes each stay resident in their own slot; --cache-reuse 256 also reuses
+# matching chunks that are not a strict prefix.
+#   PATENTDOC_LLM_SERVER=http://localhost:8080 streamlit run app.py
+LLM_SERVER_URL = os.environ.get("PATENTDOC_LLM_SERVER", "")
+
+# Identifies the model behind get_llm() in result caches, so switching models invalidates them
+MODEL_VERSION = LLM_SERVER_URL or os.path.basename(LLM_PATH) + (
+    "+" + os.path.basename(FAST_LLM_PATH) if FAST_LLM_PATH else "")
+
+
+# A llama.cpp context can only decode one sequence at a time; concurrent calls on
+# the shared instance (Generate All, several browser tabs) hang or corrupt its
+# KV cache. Model calls are queued on this lock, everything else still overlaps.
+_MODEL_LOCK = threading.Lock()
+
+
+def _parse_cpu_list(text: str) -> set:
+    """Parse a sysfs CPU list such as "0-3,8,10-11" into a set of CPU ids."""
+    cpus = set()
+    for part in text.strip().split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def _detect_optimal_threads() -> int:
+    """
+    Number of physical performance cores this process may run on.
+
+    GGML kernels gain nothing from SMT siblings (they share the ALUs), and on hybrid
+    Intel CPUs a thread on an E-core makes every other thread wait for it.
+    """
+    cpus = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else set(range(os.cpu_count() or 1))
+    try:
+        with open("/sys/devices/cpu_core/cpus") as f:  # only present on hybrid (P/E-core) CPUs
+            cpus = (cpus & _parse_cpu_list(f.read())) or cpus
+    except OSError:
+        pass
+
+    cores = set()
+    for cpu in cpus:
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list") as f:
+                cores.add(f.read().strip())
+        except OSError:
+            cores.add(str(cpu))
+    return max(1, len(cores))
+
+
+# Threads for token generation and for prompt prefill (batch). PATENTDOC_N_THREADS overrides both.
+N_THREADS = int(os.environ.get("PATENTDOC_N_THREADS", "0")) or _detect_optimal_threads()
+
+# On multi-socket hosts spread the threads and weight pages across NUMA nodes, so decode
+# is not limited to one node's memory bandwidth plus remote accesses.
+NUMA = len(glob.glob("/sys/devices/system/node/node[0-9]*")) > 1
+
+# Transformer layers to offload to the GPU (-1 = all). Decoding is memory-bandwidth bound,
+# so VRAM is the biggest single speedup; llama-cpp-python must be built with
+# CMAKE_ARGS="-DGGML_CUDA=on" (or -DGGML_METAL=on). PATENTDOC_GPU_LAYERS=0 forces CPU.
+N_GPU_LAYERS = int(os.environ.get("PATENTDOC_GPU_LAYERS", "-1"))
+
+# Minimum seconds between on_text updates while streaming. Every call re-renders a
+# Streamlit element over the websocket; per-token updates on a 2k-token section
+# cost more than the render is worth.
+STREAM_UPDATE_INTERVAL = 0.1
+
+
+def load_llm(model_path: str):
+    """
+    Build a Llama instance with the settings shared by all section generators.
+
+    n_ctx covers the longest section (detailed description); the weights are
+    memory-mapped, so they are only paged in once however many modules use them.
+    """
+    # llama-cpp reports a missing file with the same ValueError as a failed GPU load
+    if not os.path.isfile(model_path):
+        raise ValueError(f"Model path does not exist: {model_path}")
+    from llama_cpp import Llama, LlamaDiskCache, LlamaRAMCache
+    settings = dict(
+        model_path=model_path,
+        n_ctx=8192,
+        n_threads=N_THREADS,
+        n_threads_batch=N_THREADS,
+        n_batch=2048,  # Logical prefill batch: a whole section prompt in one decode call
+        n_ubatch=512,  # Physical batch actually computed per step
+        n_gpu_layers=N_GPU_LAYERS,
+        use_mmap=True,
+        use_mlock=USE_MLOCK,
+        numa=NUMA,
+        verbose=False
+    )
+    try:
+        llm = Llama(**settings)
+    except (RuntimeError, ValueError) as e:
+        # The GPU backend failed to initialise or the weights do not fit in VRAM:
+        # fall back to a CPU-only context instead of failing every section
+        if settings["n_gpu_layers"] == 0:
+            raise
+        print(f"⚠️ GPU offload failed ({e}), loading the model on CPU")
+        llm = Llama(**dict(settings, n_gpu_layers=0))
+    # GGUF general.file_type: 0 = F32, 1 = F16, 7 = Q8_0, 32 = BF16
+    if str(llm.metadata.get("general.file_type")) in ("0", "1", "7", "32"):
+        print(f"⚠️ {os.path.basename(model_path)} is not 4-bit quantized: decoding moves 2-4x the "
+              "bytes per token of Q4_K_M. See quantize_model.py.")
+    if PROMPT_CACHE_DIR:
+        llm.set_cache(LlamaDiskCache(cache_dir=PROMPT_CACHE_DIR, capacity_bytes=PROMPT_CACHE_BYTES))
+    else:
+        llm.set_cache(LlamaRAMCache(capacity_bytes=PROMPT_CACHE_BYTES))
+    return llm
+
+
+class LlamaServerClient:
+    """
+    Minimal stand-in for llama_cpp.Llama that forwards completions to a llama-server
+    OpenAI-compatible /v1/completions endpoint. Responses (and streamed chunks) have
+    the same {"choices": [{"text": ...}]} shape as the in-process model.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 600):
+        self.url = base_url.rstrip("/") + "/v1/completions"
+        self.timeout = timeout
+        self._local = threading.local()  # requests.Session is not thread-safe
+
+    @property
+    def session(self):
+        if not hasattr(self._local, "session"):
+            import requests
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def __call__(self, prompt: str, stream: bool = False, **params):
+        # cache_prompt keeps each slot's KV state and only decodes the part of a new prompt
+        # after the common prefix (explicit for older servers where it defaults to off)
+        payload = {"prompt": prompt, "stream": stream, "cache_prompt": True, **params}
+        response = self.session.post(self.url, json=payload, stream=stream, timeout=self.timeout)
+        response.raise_for_status()
+        if not stream:
+            return response.json()
+        return self._iter_chunks(response)
+
+    @staticmethod
+    def _iter_chunks(response):
+        # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            data = line[len("data: "):]
+            if data == "[DONE]":
+                break
+            yield json.loads(data)
+
+
+@lru_cache(maxsize=1)
+def get_llm():
+    """Load the model once per process and share it between all section generators."""
+    if LLM_SERVER_URL:
+        return LlamaServerClient(LLM_SERVER_URL)
+    return load_llm(LLM_PATH)
+
+
+@lru_cache(maxsize=1)
+def get_fast_llm():
+    """Model for the descriptive sections: FAST_LLM_PATH when set, otherwise get_llm()."""
+    if LLM_SERVER_URL or not FAST_LLM_PATH or FAST_LLM_PATH == LLM_PATH:
+        return get_llm()
+    return load_llm(FAST_LLM_PATH)
+
+
+def model_identity(llm) -> str:
+    """Name of a loaded model for cache keys: its llama-server URL or GGUF file name."""
+    if isinstance(llm, LlamaServerClient):
+        return llm.url
+    model_path = getattr(llm, "model_path", None)
+    return os.path.basename(model_path) if model_path else type(llm).__qualname__
+
+
+# Recently tokenized prompts, per model. Weakly keyed, so the cache never keeps a model
+# alive after its last user drops it (quantize_model.py loads and frees several in turn).
+_PROMPT_TOKENS = weakref.WeakKeyDictionary()
+_PROMPT_TOKENS_LOCK = threading.Lock()
+PROMPT_TOKENS_PER_MODEL = 16
+
+
+def _tokenize_prompt(llm, prompt: str) -> tuple:
+    """Token ids for prompt, exactly as Llama.create_completion would tokenize the string."""
+    with _PROMPT_TOKENS_LOCK:
+        cache = _PROMPT_TOKENS.setdefault(llm, OrderedDict())
+        tokens = cache.get(prompt)
+        if tokens is not None:
+            cache.move_to_end(prompt)
+            return tokens
+    tokens = tuple(llm.tokenize(prompt.encode("utf-8"), special=True))
+    with _PROMPT_TOKENS_LOCK:
+        cache[prompt] = tokens
+        if len(cache) > PROMPT_TOKENS_PER_MODEL:
+            cache.popitem(last=False)
+    return tokens
+
+
+def run_completion(llm, prompt: str, on_text: Optional[Callable[[str], None]] = None,
+                   prefix: str = "", should_stop: Optional[Callable[[str], bool]] = None,
+                   **params) -> str:
+    """
+    Run a single completion and return the generated text.
+
+    If on_text is given the completion is streamed token by token and on_text is
+    called with the text generated so far (after `prefix`, the text the prompt ends
+    with), so the UI can render partial output while decoding is still running.
+    Updates are throttled to one per STREAM_UPDATE_INTERVAL, plus a final one.
+
+    If should_stop is given the completion is streamed as well, and decoding ends as
+    soon as should_stop(text so far) returns True; the text up to that point is returned.
+    """
+    # The server batches concurrent requests itself; only the in-process model needs the lock
+    if isinstance(llm, LlamaServerClient):
+        lock = nullcontext()
+    else:
+        lock = _MODEL_LOCK
+        # Tokenized outside the lock (the vocabulary is read-only), and only once for the
+        # retries and streamed re-runs that send the same prompt again
+        prompt = list(_tokenize_prompt(llm, prompt))
+    with lock:
+        if on_text is None and should_stop is None:
+            response = llm(prompt=prompt, **params)
+            return response["choices"][0]["text"]
+
+        text = ""
+        last_update = 0.0
+        stream = llm(prompt=prompt, stream=True, **params)
+        try:
+            for chunk in stream:
+                text += chunk["choices"][0]["text"]
+                if should_stop is not None and should_stop(text):
+                    break
+                if on_text is not None:
+                    now = time.monotonic()
+                    if now - last_update >= STREAM_UPDATE_INTERVAL:
+                        on_text(prefix + text)
+                        last_update = now
+        finally:
+            # Closing the generator ends decoding (and the HTTP stream for llama-server)
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        if on_text is not None:
+            on_text(prefix + text)
+        return text
+
+
+def terminal_stream(out=sys.stdout) -> Callable[[str], None]:
+    """
+    on_text callback for the command-line generators: echo the text to the terminal
+    while it is being decoded, instead of printing nothing until the section is done.
+    A retry that starts over is shown after a blank line.
+    """
+    shown = ""
+
+    def on_text(text: str):
+        nonlocal shown
+        if not text.startswith(shown):
+            out.write("\n\n")
+            shown = ""
+        out.write(text[len(shown):])
+        out.flush()
+        shown = text
+
+    return on_text
@@ -1,7 +1,9 @@
 # match_drawings.py
 import json
 import torch
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
+
+from embeddings import get_embedder
 
 # Load the claim (could be passed dynamically later)
 claim = input("🔍 Enter a patent claim to match drawings:\n> ")
@@ -12,7 +14,7 @@ with open("data/drawing_captions.json", "r") as f:
 
 # Load model
 print("🤖 Loading embedding model (MiniLM)...")
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+model = get_embedder()
 
 # Encode
 claim_embedding = model.encode(claim, convert_to_tensor=True)
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+from itertools import islice
+
+from llm_loader import load_llm
+from generate_title import generate_title_from_abstract
+
+# 🐍 --- Re-quantize the Phi-3 GGUF and check title quality before switching --- 🐍
+#
+#   python quantize_model.py quantize models/phi-3-mini-4k-instruct-fp16.gguf models/phi-3-mini-4k-instruct-q4_k_m.gguf
+#   python quantize_model.py compare models/phi-3-mini-4k-instruct-fp16.gguf models/phi-3-mini-4k-instruct-q4_k_m.gguf
+#
+# compare reads abstracts from the JSONL file written by save_bigpatent.py (the same one
+# build_faiss_index.py uses); pass --abstracts to use any other file with an "abstract" field.
+#
+# On CPU-only servers try --type Q4_0 as well: llama.cpp repacks Q4_0 weights at load time
+# into interleaved blocks for its AVX2/AVX512-VNNI/AMX (and ARM i8mm) int8 dot-product
+# kernels, which usually beats Q4_K_M on both prefill and decode at slightly lower quality.
+#
+# Then point PATENTDOC_LLM_PATH at the new file. To keep claims on Q4_K_M while the long
+# background and brief description use a smaller build (e.g. --type Q3_K_M, about a quarter
+# fewer bytes per token), set PATENTDOC_FAST_LLM_PATH to that file instead.
+
+ABSTRACTS_PATH = "data/bigpatent_tiny/bigpatent_c.jsonl"
+
+
+def quantize(source: str, target: str, qtype: str = "Q4_K_M"):
+    print(f"📦 Quantizing {source} → {target} ({qtype})...")
+    subprocess.run(["llama-quantize", source, target, qtype], check=True)
+    print("✅ Quantized model saved.")
+
+
+def token_overlap(a: str, b: str) -> float:
+    """F1 overlap of lowercase word tokens (a cheap BLEU-like agreement score)."""
+    ta = re.findall(r'\w+', a.lower())
+    tb = re.findall(r'\w+', b.lower())
+    if not ta or not tb:
+        return 0.0
+    common = len(set(ta) & set(tb))
+    if common == 0:
+        return 0.0
+    precision = common / len(set(tb))
+    recall = common / len(set(ta))
+    return 2 * precision * recall / (precision + recall)
+
+
+def compare(reference: str, candidate: str, limit: int = 20, abstracts_path: str = ABSTRACTS_PATH):
+    if not os.path.isfile(abstracts_path):
+        raise FileNotFoundError(f"Abstracts file not found: {abstracts_path} "
+                                "(run save_bigpatent.py or pass --abstracts)")
+    with open(abstracts_path, "r", encoding="utf-8") as f:
+        abstracts = [json.loads(line).get("abstract", "") for line in islice(filter(str.strip, f), limit)]
+    if not abstracts:
+        raise ValueError(f"No abstracts in {abstracts_path}")
+
+    print(f"🧠 Generating {len(abstracts)} titles with each model...")
+    titles = []
+    for path in (reference, candidate):
+        llm = load_llm(path)
+        titles.append([generate_title_from_abstract(a, max_attempts=1, llm=llm)["title"] for a in abstracts])
+        del llm
+
+    overlaps = [token_overlap(ref, cand) for ref, cand in zip(*titles)]
+    for i, (ref, cand) in enumerate(zip(*titles)):
+        print(f"{i + 1:2d}. {overlaps[i]:.2f}  {ref}\n          {cand}")
+
+    print(f"\n📊 Mean title overlap: {sum(overlaps) / len(overlaps):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-quantize the Phi-3 GGUF and compare title quality")
+    parser.add_argument("command", choices=["quantize", "compare"])
+    parser.add_argument("source", help="Input / reference GGUF")
+    parser.add_argument("target", help="Output / candidate GGUF")
+    parser.add_argument("--type", default="Q4_K_M", help="llama-quantize type (e.g. Q4_K_M, Q4_0, Q3_K_M, IQ4_XS)")
+    parser.add_argument("--limit", type=int, default=20, help="Abstracts to compare")
+    parser.add_argument("--abstracts", default=ABSTRACTS_PATH, help="JSONL file with an \"abstract\" field per line")
+    args = parser.parse_args()
+
+    if args.command == "quantize":
+        quantize(args.source, args.target, args.type)
+    else:
+        try:
+            compare(args.source, args.target, args.limit, args.abstracts)
+        except FileNotFoundError as e:
+            parser.error(str(e))
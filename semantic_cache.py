@@ -0,0 +1,55 @@
+"""
+Semantic cache for generated sections: reuse a previous result when the new abstract is a
+near-duplicate (typo fix, synonym swap) of one that was already generated.
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Per-section store of (normalized abstract embedding, output) pairs.
+
+    A lookup is one matrix-vector product against the stored embeddings of that section;
+    the best match is returned when its cosine similarity is at least `threshold`.
+    """
+
+    def __init__(self, embed: Callable[[str], np.ndarray], threshold: float = 0.95,
+                 max_entries: int = 256):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, List[Any]] = {}
+
+    def lookup(self, section: str, text: str) -> Tuple[np.ndarray, Optional[Any]]:
+        """Return (embedding of text, cached output or None)."""
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        with self._lock:
+            matrix = self._vectors.get(section)
+            if matrix is None:
+                return vector, None
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return vector, self._values[section][best]
+        return vector, None
+
+    def store(self, section: str, vector: np.ndarray, value: Any):
+        with self._lock:
+            matrix = self._vectors.get(section)
+            values = self._values.setdefault(section, [])
+            if matrix is None:
+                matrix = vector[None, :]
+            else:
+                matrix = np.vstack([matrix, vector])
+            values.append(value)
+            # Drop the oldest entries once the section is full
+            if len(values) > self.max_entries:
+                matrix = matrix[-self.max_entries:]
+                del values[:-self.max_entries]
+            self._vectors[section] = matrix
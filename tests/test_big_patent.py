@@ -0,0 +1,56 @@
+import gzip
+import importlib.util
+import json
+import os
+
+import pytest
+
+pytest.importorskip("datasets")
+
+# The loading script lives in datasets/big_patent/, which is not an importable package
+_SPEC = importlib.util.spec_from_file_location(
+    "big_patent", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "datasets", "big_patent", "big_patent.py"))
+big_patent = importlib.util.module_from_spec(_SPEC)
+_SPEC.loader.exec_module(big_patent)
+
+
+def _write_fixture(path, count=200):
+    """Write count records as gzipped JSON lines; return the expected (byte offset, line) pairs."""
+    records = [{"abstract": f"Abstract {i} — Überwachung 野生动物 🐘" * (i % 7 + 1),
+                "description": "x" * (i * 13 % 500), "title": f"Title {i}",
+                "application_number": str(i)} for i in range(count)]
+    lines = [json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n" for record in records]
+    # No newline after the last record
+    lines[-1] = lines[-1].rstrip(b"\n")
+    with gzip.open(path, "wb") as f:
+        f.write(b"".join(lines))
+    offsets = [0]
+    for line in lines[:-1]:
+        offsets.append(offsets[-1] + len(line))
+    return list(zip(offsets, lines))
+
+
+def test_read_lines_whole_file(tmp_path):
+    path = str(tmp_path / "c.json.gz")
+    expected = _write_fixture(path)
+    assert list(big_patent._read_lines(path, 0, None)) == expected
+
+
+def test_read_lines_byte_shards_cover_every_line_once(tmp_path):
+    pytest.importorskip("indexed_gzip")
+    path = str(tmp_path / "c.json.gz")
+    expected = _write_fixture(path)
+    raw = b"".join(line for _, line in expected)
+
+    shards = big_patent._byte_shards(path, 7)
+    assert len(shards) == 7 and shards[0][0] == 0 and shards[-1][1] is None
+    assert [pair for start, end in shards for pair in big_patent._read_lines(path, start, end)] == expected
+
+    # Boundaries exactly at a line start, one byte either side of it, inside a multi-byte
+    # character, and at the very end of the file
+    line_start = expected[50][0]
+    multibyte = raw.index("野".encode("utf-8"), line_start) + 1
+    for cut in (line_start - 1, line_start, line_start + 1, multibyte, len(raw) - 1, len(raw)):
+        pairs = list(big_patent._read_lines(path, 0, cut)) + list(big_patent._read_lines(path, cut, None))
+        assert pairs == expected, cut
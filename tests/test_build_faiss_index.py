@@ -0,0 +1,60 @@
+import json
+
+from build_faiss_index import write_metadata
+from generate_claims import MetadataStore
+
+
+RECORDS = [
+    {"abstract": "A sensor node for elephant detection.", "background": "Conflict is rising."},
+    {"abstract": "Überwachungssystem für Wildtiere — 野生动物监测 🐘", "background": "Ünïcödé, \"quoted\", \\ and\nnewline"},
+    {"background": "No abstract here"},
+    {"abstract": "", "background": ""},
+    {"abstract": "Last line, written without a trailing newline: ∑ ≥ 1.", "background": "end"},
+]
+
+
+def _write_jsonl(path, records):
+    lines = [json.dumps(record, ensure_ascii=False) for record in records]
+    # A blank line in the middle and no newline after the last record
+    path.write_bytes(("\n".join(lines[:2]) + "\n\n" + "\n".join(lines[2:])).encode("utf-8"))
+
+
+# What write_metadata stores per non-blank line: the abstract (or a placeholder) and the background
+EXPECTED = [
+    {"abstract": "A sensor node for elephant detection.", "background": "Conflict is rising."},
+    {"abstract": "Überwachungssystem für Wildtiere — 野生动物监测 🐘", "background": "Ünïcödé, \"quoted\", \\ and\nnewline"},
+    {"abstract": "[Missing abstract]", "background": "No abstract here"},
+    {"abstract": "", "background": ""},
+    {"abstract": "Last line, written without a trailing newline: ∑ ≥ 1.", "background": "end"},
+]
+
+
+def test_metadata_store_reads_every_record(tmp_path):
+    data_path = tmp_path / "bigpatent.jsonl"
+    metadata_path = tmp_path / "faiss_metadata.json"
+    offsets_path = tmp_path / "faiss_metadata.offsets.npy"
+    _write_jsonl(data_path, RECORDS)
+
+    texts = write_metadata(str(data_path), str(metadata_path), str(offsets_path))
+
+    assert texts == [record.get("abstract", "") for record in RECORDS]
+    # Still a plain JSON array for json.load (the fallback when the offsets file is stale)
+    assert json.loads(metadata_path.read_text(encoding="utf-8")) == EXPECTED
+
+    store = MetadataStore(str(metadata_path), str(offsets_path))
+    assert len(store) == len(EXPECTED)
+    assert [store[i] for i in range(len(store))] == EXPECTED
+    # Random access in any order, across the first and last offset boundaries
+    assert store[len(store) - 1] == EXPECTED[-1]
+    assert store[0] == EXPECTED[0]
+
+
+def test_metadata_store_empty_corpus(tmp_path):
+    data_path = tmp_path / "bigpatent.jsonl"
+    data_path.write_bytes(b"\n")
+    metadata_path = tmp_path / "faiss_metadata.json"
+    offsets_path = tmp_path / "faiss_metadata.offsets.npy"
+
+    assert write_metadata(str(data_path), str(metadata_path), str(offsets_path)) == []
+    assert json.loads(metadata_path.read_text()) == []
+    assert len(MetadataStore(str(metadata_path), str(offsets_path))) == 0
@@ -0,0 +1,126 @@
+import pytest
+
+from generate_background import NEED_ISSUE, clean_background_text, format_for_patent_document, validate_background
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", 0),
+    ("One paragraph.", 1),
+    ("First.\n\nSecond.", 2),
+    ("First.\n\n\n\nSecond.\n\n\n", 2),
+    ("  First.\n \n\t\nSecond.\n\nThird.  ", 3),
+])
+def test_validate_background_counts_paragraphs_in_raw_text(text, expected):
+    assert validate_background(text)["paragraph_count"] == expected
+
+
+def test_validate_background_counts_cleaned_paragraphs():
+    raw = "BACKGROUND OF THE INVENTION:\n[0001] first paragraph\n\n\n\n[0002] second one\n\n \n third"
+    assert validate_background(clean_background_text(raw))["paragraph_count"] == 3
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("", ""),
+    ("   \n\n  ", ""),
+    ("BACKGROUND OF THE INVENTION:\nExisting fences fail.", "Existing fences fail."),
+    ("Background of the Invention:   the problem.", "The problem."),
+    ("[0001] Existing fences fail.\n\n[12] They are costly.", "Existing fences fail.\n\nThey are costly."),
+    # A heading and a paragraph number stacked on one line are both removed
+    ("BACKGROUND OF THE INVENTION: [0001] stacked prefix", "Stacked prefix."),
+    # Only the first of two paragraph numbers is removed
+    ("[1] [2] double number", "[2] double number."),
+])
+def test_clean_background_text_strips_headings_and_paragraph_numbers(raw, expected):
+    assert clean_background_text(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("The  limitation   is   cost", "The limitation is cost."),
+    ("first.\n\n\n\nsecond\n\n\n", "First.\n\nSecond."),
+    ("  para one \n\n\tindented para  ", "Para one.\n\nIndented para."),
+    ("élan is lower-case non-ASCII", "Élan is lower-case non-ASCII."),
+    ("1990s data\n\n\"quoted\" start", "1990s data.\n\n\"quoted\" start."),
+    ("ends with question?\n\nends with ellipsis...", "Ends with question?.\n\nEnds with ellipsis..."),
+])
+def test_clean_background_text_normalizes_paragraphs(raw, expected):
+    assert clean_background_text(raw) == expected
+
+
+def test_clean_background_text_is_idempotent():
+    raw = "BACKGROUND OF THE INVENTION:\n[0001] existing fences fail\n\n\n[0002] a need exists"
+    once = clean_background_text(raw)
+    assert clean_background_text(once) == once
+
+
+@pytest.mark.parametrize("text, flag", [
+    ("The conventional fence.", "has_existing_tech"),
+    # Phrases are matched inside longer words, as a substring test would
+    ("Unknown failures.", "has_existing_tech"),
+    ("Unknown failures.", "has_problems"),
+    ("These systems lack coverage.", "has_problems"),
+    ("Accordingly, there exists a need for better fences.", "has_need"),
+    ("A better design would be welcome.", "has_need"),
+    ("A 35% increase in incidents.", "has_statistics"),
+    ("See CN109510971A.", "has_prior_art_citations"),
+])
+def test_validate_background_detects_phrases(text, flag):
+    assert validate_background(text)[flag] is True
+
+
+def test_validate_background_reports_missing_elements():
+    report = validate_background("Fences are built.")
+    assert not any(report[flag] for flag in ("has_existing_tech", "has_problems", "has_need",
+                                             "has_statistics", "has_prior_art_citations"))
+    assert "Missing discussion of existing technology/prior art." in report["issues"]
+    assert report["issues"][-1] == NEED_ISSUE
+    assert not report["valid"]
+
+
+def test_validate_background_reports_each_prohibited_phrase_once_in_order():
+    text = "We developed it. Our invention works; our invention again. The present invention solves it."
+    found = [issue for issue in validate_background(text)["issues"] if issue.startswith("Avoid")]
+    assert found == [
+        "Avoid describing your own invention in Background. Found: 'the present invention solves'",
+        "Avoid describing your own invention in Background. Found: 'our invention'",
+        "Avoid describing your own invention in Background. Found: 'we developed'",
+    ]
+
+
+def test_validate_background_accepts_complete_background():
+    paragraph = "Existing systems suffer a 35% loss (CN109510971A); accordingly, there exists a need."
+    report = validate_background("\n\n".join([paragraph] * 40))
+    assert report["valid"], report["issues"]
+    assert report["paragraph_count"] == 40
+    assert report["warnings"] == []
+
+
+def test_validate_background_report_is_not_shared_between_calls():
+    validate_background("Fences are built.")["issues"].clear()
+    assert validate_background("Fences are built.")["issues"]
+
+
+def test_format_for_patent_document_wraps_on_word_boundaries():
+    text = ("Existing electrified fences protect farmland along forest boundaries but suffer frequent "
+            "failures. Accordingly, there exists a need for a monitoring system.\n\nSecond paragraph is short.")
+    lines = format_for_patent_document(text, add_line_numbers=True).split("\n")
+    assert lines[:6] == [
+        "BACKGROUND OF THE INVENTION",
+        "",
+        "Existing electrified fences protect farmland along forest boundaries but",
+        "suffer frequent failures.",
+        "Accordingly, there exists a need for a monitoring system.",
+        "",
+    ]
+    # Every fifth line (paragraph breaks included) carries its number on the right margin
+    assert lines[6] == "Second paragraph is short." + "5".rjust(80)
+
+
+def test_format_for_patent_document_keeps_long_words_whole():
+    word = "x" * 90
+    lines = format_for_patent_document(f"Short start {word} end", include_heading=False,
+                                       add_line_numbers=True).split("\n")
+    assert lines[:3] == ["Short start", word, "end"]
+
+
+def test_format_for_patent_document_without_line_numbers():
+    assert format_for_patent_document("a\n\nb", include_heading=False, add_line_numbers=False) == "a\n\nb"
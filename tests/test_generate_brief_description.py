@@ -0,0 +1,67 @@
+import pytest
+
+from generate_brief_description import clean_brief_description, extract_figure_info_from_abstract
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("", ""),
+    (" \n\n \t", ""),
+    ("BRIEF DESCRIPTION OF THE DRAWINGS:\nFigure 1: illustrates the system\nFigure 2: shows the sensor.",
+     "Figure 1: illustrates the system.\nFigure 2: shows the sensor."),
+    ("brief description of the drawings\n\n  figure 1 illustrates X\nFIG. 2 shows Y\nFIG 3A:: shows Z",
+     "Figure 1: illustrates X.\nFigure 2: shows Y.\nFigure 3A: shows Z."),
+    ("Figure2: no space\nfigure  3B :  extra spaces\nFIG.4 done.",
+     "Figure 2: no space.\nFigure 3B: extra spaces.\nFigure 4: done."),
+])
+def test_clean_brief_description_normalizes_figure_lines(raw, expected):
+    assert clean_brief_description(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("**Figure 1:** illustrates the ***main*** unit", "Figure 1: illustrates the main unit."),
+    # Nested bold, underline and italic are all unwrapped
+    ("**__Figure 1__**: shows *the __node__* layout", "Figure 1: shows the node layout."),
+    ("__**bold inside underline**__ and *italic **bold** italic*", "bold inside underline and italic bold italic."),
+])
+def test_clean_brief_description_unwraps_markdown(raw, expected):
+    assert clean_brief_description(raw) == expected
+
+
+@pytest.mark.parametrize("abstract, method, data", [
+    ("", False, False),
+    ("The method includes three steps.", True, False),
+    ("Results show 98% accuracy and low latency.", False, True),
+    # Keywords inside a component list still count
+    ("It consists of a process controller, a latency monitor and a relay.", True, True),
+])
+def test_extract_figure_info_detects_method_and_data(abstract, method, data):
+    info = extract_figure_info_from_abstract(abstract)
+    assert (info["has_method"], info["has_data"]) == (method, data)
+
+
+def test_extract_figure_info_lists_components_in_keyword_order():
+    # "comprising" lists come before "includes" lists, whatever their order in the text
+    abstract = ("The device includes a sensor array, a microcontroller and a buzzer. "
+                "The housing comprising steel plates and bolts.")
+    info = extract_figure_info_from_abstract(abstract)
+    assert info["system_components"] == ["steel plates and bolts", "a sensor array", "a microcontroller and a buzzer"]
+    assert info["suggested_count"] == 6
+
+
+def test_extract_figure_info_uses_first_list_per_keyword():
+    abstract = "The unit includes a sensor array and a buzzer. The hub includes a gateway and a cloud link."
+    assert extract_figure_info_from_abstract(abstract)["system_components"] == ["a sensor array and a buzzer"]
+
+
+def test_extract_figure_info_ignores_short_lists():
+    info = extract_figure_info_from_abstract("An apparatus which includes a short list.")
+    assert info["system_components"] == []
+    assert info["suggested_count"] == 3
+
+
+def test_extract_figure_info_counts_all_signals():
+    abstract = ("A system COMPRISING   an upper frame, a lower frame, a hinge assembly. "
+                "Comparative results are given. The method is new.")
+    info = extract_figure_info_from_abstract(abstract)
+    assert info["system_components"] == ["an upper frame", "a lower frame", "a hinge assembly"]
+    assert info["suggested_count"] == 9
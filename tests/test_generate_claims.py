@@ -0,0 +1,101 @@
+import generate_claims
+from generate_claims import ClaimFormatter, ClaimGenerator, ClaimValidator, ModelManager, PriorArtRetriever
+
+
+CLAIM_1_HEAD = """ A monitoring system, comprising:
+   a sensor unit (1) configured to measure a temperature,
+   a processing unit (2) configured to compare said temperature with a threshold,
+"""
+
+
+def test_claim_1_end_after_last_required_wherein():
+    text = CLAIM_1_HEAD + """   wherein the sensor unit (1) is 2.5 mm thick,
+   wherein the processing unit (2) is a microcontroller,
+   and wherein the threshold is user-configurable.
+2. The system"""
+    end = ClaimGenerator._claim_1_end(text)
+    assert text[:end].endswith("user-configurable.")
+
+
+def test_claim_1_end_skips_abbreviations_in_wherein_clause():
+    text = CLAIM_1_HEAD + """   wherein the sensor unit (1) is a thermistor,
+   wherein the processing unit (2) is a controller,
+   and wherein the alert, e.g. a buzzer, i.e. an audible signal, etc. is raised in under 2 s.
+"""
+    end = ClaimGenerator._claim_1_end(text)
+    assert text[:end].endswith("in under 2 s.")
+
+
+def test_claim_1_end_open_while_streaming():
+    # Fewer than three wherein clauses, or no full stop after the third one yet
+    assert ClaimGenerator._claim_1_end(CLAIM_1_HEAD + "   wherein the sensor. is") is None
+    streamed = CLAIM_1_HEAD + "   wherein a,\n   wherein b,\n   and wherein the alert, e.g."
+    assert ClaimGenerator._claim_1_end(streamed) is None
+    assert ClaimGenerator._claim_1_end(streamed + " a buzzer") is None
+
+
+def test_retrieve_does_not_load_index_for_memoized_search(monkeypatch):
+    def fail():
+        raise AssertionError("FAISS index loaded")
+    monkeypatch.setattr(generate_claims, "get_faiss_index", fail)
+    monkeypatch.setattr(generate_claims, "get_metadata", lambda: [{"abstract": "a"}, {"abstract": "b"}])
+    monkeypatch.setattr(generate_claims, "_search_prior_art",
+                        lambda query, top_k: (True, (0.9, 0.5), (1, 7)))
+    prior_art = PriorArtRetriever(ModelManager()).retrieve("An abstract", top_k=2)
+    assert [p["abstract"] for p in prior_art] == ["b"]
+    assert prior_art[0]["similarity"] == 0.9
+
+
+# --- ClaimValidator ---
+
+def _formatted_claims(wherein: bool) -> str:
+    clause = ",\n   wherein the sensor unit (1) is waterproof" if wherein else ""
+    claim_1 = ("1. A monitoring system, comprising:\n   a sensor unit (1),\n   a controller (2),\n"
+               "   a radio (3)" + clause + (clause.replace("sensor unit (1)", "radio (3)")) + ".")
+    dependent = [f"{n}. The system as claimed in claim 1, wherein the controller (2) sleeps." for n in range(2, 9)]
+    method_9 = "9. A method for monitoring using the system as claimed in claim 1, comprising steps of sensing."
+    subclaims = [f"{n}. The method as claimed in claim 9, wherein sensing repeats." for n in (10, 11)]
+    return ClaimFormatter.format_complete_claims({'claim_text': claim_1}, dependent, method_9, subclaims)
+
+
+def test_validate_accepts_formatted_claims():
+    report = ClaimValidator.validate(_formatted_claims(wherein=True))
+    assert report["valid"]
+    assert (report["issues"], report["warnings"], report["suggestions"]) == ([], [], [])
+    assert report["statistics"] == {
+        "total_claims": 11, "independent_claims": 2, "dependent_claims": 9, "method_claims": 1,
+        "wherein_clauses_total": 11, "has_reference_numbers": True,
+    }
+    assert report["compliance_score"] == 100.0
+
+
+def test_validate_reports_claim_1_without_wherein():
+    report = ClaimValidator.validate(_formatted_claims(wherein=False))
+    assert report["issues"] == ["❌ Claim 1 has no 'wherein' clauses (minimum 2 required)"]
+    assert report["compliance_score"] == 85.0
+
+
+def test_validate_reports_missing_header_and_artifacts():
+    claims_text = _formatted_claims(wherein=True).replace("WE CLAIM", "") + "\n<|assistant|> ==="
+    assert ClaimValidator.validate(claims_text)["issues"] == [
+        "❌ Missing 'WE CLAIM' header (mandatory)",
+        "❌ LLM artifacts found in claims (must be removed)",
+    ]
+
+
+def test_validate_reports_short_claim_set():
+    report = ClaimValidator.validate(
+        "WE CLAIM\n1. A device comprising (1) wherein x.\n2. The device as claimed in claim 1, wherein y.")
+    assert report["issues"] == ["❌ Insufficient claims: 2 (minimum 9 expected)"]
+    assert report["warnings"] == [
+        "⚠️  Claim 1 has only 1 'wherein' clause (3-5 recommended)",
+        "⚠️  Few reference numbers in Claim 1 (use (1), (2), (3) etc.)",
+        "⚠️  No method claim found at position 9",
+        "⚠️  Only 1 dependent claims found",
+    ]
+    assert report["suggestions"] == [
+        "💡 Add line numbers every 5 lines on right margin",
+        "💡 Use proper indentation for sub-elements",
+    ]
+    assert report["statistics"]["total_claims"] == 2
+    assert report["statistics"]["dependent_claims"] == 1
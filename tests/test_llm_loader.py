@@ -0,0 +1,48 @@
+import gc
+import weakref
+
+import pytest
+
+import llm_loader
+
+
+class FakeLlama:
+    """Just enough of llama_cpp.Llama for the tokenizer cache."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, text, special=False):
+        self.calls += 1
+        return list(text)
+
+
+def test_tokenize_prompt_is_cached_per_model():
+    first, second = FakeLlama(), FakeLlama()
+    assert llm_loader._tokenize_prompt(first, "ab") == (97, 98)
+    assert llm_loader._tokenize_prompt(first, "ab") == (97, 98)
+    assert llm_loader._tokenize_prompt(second, "ab") == (97, 98)
+    assert (first.calls, second.calls) == (1, 1)
+
+
+def test_tokenize_prompt_evicts_oldest_prompt():
+    llm = FakeLlama()
+    for i in range(llm_loader.PROMPT_TOKENS_PER_MODEL + 1):
+        llm_loader._tokenize_prompt(llm, str(i))
+    llm_loader._tokenize_prompt(llm, "0")
+    assert llm.calls == llm_loader.PROMPT_TOKENS_PER_MODEL + 2
+
+
+def test_released_model_is_garbage_collected():
+    llm = FakeLlama()
+    llm_loader._tokenize_prompt(llm, "prompt")
+    released = weakref.ref(llm)
+    del llm
+    gc.collect()
+    assert released() is None
+
+
+def test_load_llm_reports_missing_model_without_cpu_retry(tmp_path, capsys):
+    with pytest.raises(ValueError, match="does not exist"):
+        llm_loader.load_llm(str(tmp_path / "missing.gguf"))
+    assert "GPU offload failed" not in capsys.readouterr().out
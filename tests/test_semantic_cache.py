@@ -0,0 +1,65 @@
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def _unit(angle):
+    """2-d unit vector at `angle` radians; cosine between two of them is cos(difference)."""
+    return np.array([np.cos(angle), np.sin(angle)], dtype=np.float32)
+
+
+class StubEmbedder:
+    """Embeds a text by looking its vector up in a fixed table."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def __call__(self, text):
+        return self.vectors[text]
+
+
+def _cache(max_entries=256):
+    vectors = {
+        "stored": _unit(0.0),
+        "near": _unit(np.arccos(0.96)),   # cosine 0.96 with "stored"
+        "far": _unit(np.arccos(0.94)),    # cosine 0.94 with "stored"
+        "other": _unit(np.pi / 2),
+    }
+    return SemanticCache(StubEmbedder(vectors), threshold=0.95, max_entries=max_entries)
+
+
+def test_hit_at_or_above_threshold_miss_below():
+    cache = _cache()
+    vector, hit = cache.lookup("title", "stored")
+    assert hit is None
+    cache.store("title", vector, "A Title")
+
+    assert cache.lookup("title", "stored")[1] == "A Title"
+    assert cache.lookup("title", "near")[1] == "A Title"
+    assert cache.lookup("title", "far")[1] is None
+
+
+def test_best_match_is_returned():
+    cache = _cache()
+    cache.store("title", cache.lookup("title", "other")[0], "Other")
+    cache.store("title", cache.lookup("title", "stored")[0], "Stored")
+    assert cache.lookup("title", "near")[1] == "Stored"
+    assert cache.lookup("title", "other")[1] == "Other"
+
+
+def test_sections_are_isolated():
+    cache = _cache()
+    cache.store("title", cache.lookup("title", "stored")[0], "A Title")
+    assert cache.lookup("summary", "stored")[1] is None
+    cache.store("summary", cache.lookup("summary", "stored")[0], "A Summary")
+    assert cache.lookup("title", "stored")[1] == "A Title"
+    assert cache.lookup("summary", "stored")[1] == "A Summary"
+
+
+def test_oldest_entries_are_evicted():
+    cache = _cache(max_entries=2)
+    cache.store("title", cache.lookup("title", "stored")[0], "first")
+    cache.store("title", cache.lookup("title", "other")[0], "second")
+    cache.store("title", _unit(np.pi), "third")  # cosine -1 with "stored", 0 with "other"
+    assert cache.lookup("title", "stored")[1] is None
+    assert cache.lookup("title", "other")[1] == "second"